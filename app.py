@@ -1,12 +1,42 @@
-from flask import Flask, render_template_string, render_template, request, flash, redirect, url_for, session, abort
+from flask import Flask, render_template_string, render_template, request, flash, redirect, url_for, session, abort, jsonify, Response, stream_with_context, g, send_from_directory, make_response
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField, SelectField, TextAreaField, PasswordField
-from wtforms.validators import DataRequired, Email, ValidationError
+from wtforms.validators import DataRequired, Email
 import os
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text, or_, and_
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from sqlalchemy import text, or_, tuple_, event
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload
+from sqlalchemy.schema import CreateTable
+from werkzeug.datastructures import MultiDict
+from datetime import datetime, timedelta
+from collections import namedtuple
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows: migrations are not serialized across processes
+    fcntl = None
+import csv
+import io
+import json
+from broker import create_broker
+from ingest import BatchWriter, QueueFull
+from cache import TTLCache
+from sqlmetrics import SQLInstrumentation
+from hashing import PasswordHasher, HasherBusy
+from assets import AssetManifest
+from compression import Compressor
+from fulltext import match_expression, highlight, HIGHLIGHT_START, HIGHLIGHT_END
+import fulltext
+from archive import Archive
+import click
+import hashlib
+import urllib.parse
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'tajnykey')
@@ -14,23 +44,173 @@ app.config['WTF_CSRF_ENABLED'] = False
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI', 'sqlite:///formdata.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SESSION_PERMANENT'] = False  # odhlášení po zavření prohlížeče (session cookie)
+app.config['THREAD_PAGE_SIZE'] = int(os.environ.get('THREAD_PAGE_SIZE', 50))  # zpráv na stránku vlákna
+# memory:// = jeden proces; sqlite:///broker.db = sdílený broker pro více workerů
+app.config['MESSAGE_BROKER_URL'] = os.environ.get('MESSAGE_BROKER_URL', 'memory://')
+app.config['USER_SEARCH_LIMIT'] = int(os.environ.get('USER_SEARCH_LIMIT', 20))  # max. výsledků hledání uživatelů
+# Substring hledání přes FTS5 trigram index (vypne se samo, pokud SQLite FTS5 nepodporuje)
+app.config['USER_SEARCH_TRIGRAM'] = os.environ.get('USER_SEARCH_TRIGRAM', '1') == '1'
+# Fulltext nad obsahem zpráv a formulářů (FTS5; vypne se samo, pokud SQLite FTS5 nepodporuje)
+app.config['FULLTEXT_SEARCH'] = os.environ.get('FULLTEXT_SEARCH', '1') == '1'
+app.config['SEARCH_PAGE_SIZE'] = int(os.environ.get('SEARCH_PAGE_SIZE', 20))  # výsledků fulltextu na stránku
+app.config['ADMIN_PAGE_SIZE'] = int(os.environ.get('ADMIN_PAGE_SIZE', 50))  # záznamů na stránku v adminu
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))  # řádků na dávku při exportu
+app.config['BULK_DELETE_CHUNK'] = int(os.environ.get('BULK_DELETE_CHUNK', 500))  # řádků na jeden DELETE (krátký zápisový zámek)
+app.config['BULK_DELETE_ASYNC_THRESHOLD'] = int(os.environ.get('BULK_DELETE_ASYNC_THRESHOLD', 5000))  # nad tento počet běží mazání na pozadí
+# Úloha na pozadí bez průběhu déle než N sekund (worker restartován) se označí jako selhaná
+app.config['ADMIN_JOB_STALE_SECONDS'] = int(os.environ.get('ADMIN_JOB_STALE_SECONDS', 300))
+# Retence (`flask retention`): zprávy/formuláře starší než N dní nebo nad N nejnovějších se přesunou do archivu; 0 = vypnuto
+app.config['MESSAGE_RETENTION_DAYS'] = int(os.environ.get('MESSAGE_RETENTION_DAYS', 0))
+app.config['MESSAGE_RETENTION_KEEP'] = int(os.environ.get('MESSAGE_RETENTION_KEEP', 0))
+app.config['FORM_RETENTION_DAYS'] = int(os.environ.get('FORM_RETENTION_DAYS', 0))
+app.config['FORM_RETENTION_KEEP'] = int(os.environ.get('FORM_RETENTION_KEEP', 0))
+app.config['RETENTION_CHUNK'] = int(os.environ.get('RETENTION_CHUNK', 1000))  # řádků na jeden přesun (krátký zápisový zámek)
+app.config['RETENTION_VACUUM_PAGES'] = int(os.environ.get('RETENTION_VACUUM_PAGES', 2000))  # stránek vrácených inkrementálním VACUUM po každé dávce
+# Archivní SQLite soubor (výchozí archive.db vedle hlavní DB) a úroveň zlib komprese
+app.config['ARCHIVE_PATH'] = os.environ.get('ARCHIVE_PATH', '')
+app.config['ARCHIVE_COMPRESS_LEVEL'] = int(os.environ.get('ARCHIVE_COMPRESS_LEVEL', 6))
+# Ukládání formulářů: direct = commit na každý POST, buffered = dávkový zápis vláknem na pozadí
+app.config['INGEST_MODE'] = os.environ.get('INGEST_MODE', 'direct')
+app.config['INGEST_BATCH_SIZE'] = int(os.environ.get('INGEST_BATCH_SIZE', 200))  # max. řádků v jednom INSERT
+app.config['INGEST_FLUSH_INTERVAL'] = float(os.environ.get('INGEST_FLUSH_INTERVAL', 0.05))  # sekundy sběru dávky
+app.config['INGEST_QUEUE_SIZE'] = int(os.environ.get('INGEST_QUEUE_SIZE', 10000))  # kapacita fronty
+app.config['INGEST_ENQUEUE_TIMEOUT'] = float(os.environ.get('INGEST_ENQUEUE_TIMEOUT', 0.5))  # čekání na místo ve frontě
+app.config['INGEST_COMMIT_TIMEOUT'] = float(os.environ.get('INGEST_COMMIT_TIMEOUT', 10))  # čekání na zápis dávky (INGEST_DURABILITY=commit)
+# commit = odpověď až po zápisu dávky (group commit), queued = odpověď hned po zařazení do fronty
+app.config['INGEST_DURABILITY'] = os.environ.get('INGEST_DURABILITY', 'commit')
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 10000))  # uživatelů v procesní cache
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 60))  # sekundy platnosti záznamu v cache
+# Hashování hesel v omezeném poolu procesů; změna metody/ceny se u uživatele projeví při dalším přihlášení
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # 0 = hashovat přímo ve vlákně requestu
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16))  # nad tento počet rychlé odmítnutí (503)
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))  # sekundy
+# Při startu aplikovat chybějící migrace (lokální běh); v produkci `flask migrate` při deployi a AUTO_MIGRATE=0
+app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', '1') == '1'
+# Otiskované statické soubory (python assets.py) se cachují natrvalo
+app.config['ASSET_MAX_AGE'] = int(os.environ.get('ASSET_MAX_AGE', 365 * 24 * 3600))  # sekundy
+app.config['SSE_KEEPALIVE'] = int(os.environ.get('SSE_KEEPALIVE', 15))  # sekundy mezi keep-alive komentáři
+# Port samostatného gevent serveru jen pro /messages/stream (gunicorn_stream.conf.py); prázdné = stejný server
+app.config['SSE_STREAM_PORT'] = os.environ.get('SSE_STREAM_PORT', '')
+# Výkonový profil SQLite: production = WAL + PRAGMA ladění + pool spojení, default = holé výchozí chování
+app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE', 'production')
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),  # čtenáři neblokují zapisovatele
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),  # ve WAL bezpečné, fsync jen při checkpointu
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # ms čekání na zámek místo chyby
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -20000)),  # záporné = KiB (≈20 MB na spojení)
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 268435456)),  # 256 MB
+    'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))  # trvalá spojení na proces (≈ počet vláken)
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+app.logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO'))
+# Počty a časy SQL dotazů na request (hlavičky X-Query-*, /metrics, slow-query log)
+app.config['SQL_INSTRUMENTATION'] = os.environ.get('SQL_INSTRUMENTATION', '1') == '1'
+app.config['SQL_SLOW_QUERY_MS'] = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))  # práh pro slow-query log
+app.config['SQL_REPEAT_THRESHOLD'] = int(os.environ.get('SQL_REPEAT_THRESHOLD', 5))  # opakování téhož dotazu = varování N+1
+# Komprese dynamických odpovědí (HTML/JSON) od této velikosti v bajtech
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_GZIP_LEVEL'] = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+
+def sqlite_profile_enabled():
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    return app.config['DB_PROFILE'] == 'production' and uri.startswith('sqlite:///') and uri != 'sqlite:///:memory:'
+
+if sqlite_profile_enabled():
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': QueuePool,
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+        # pooled connections move between request threads (one at a time)
+        'connect_args': {'check_same_thread': False, 'timeout': app.config['SQLITE_PRAGMAS']['busy_timeout'] / 1000},
+    }
 db = SQLAlchemy(app)
 
-# Preload Jinja macros and expose as global `ui` for templates
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+if sqlite_profile_enabled():
+    with app.app_context():
+        event.listen(db.engine, 'connect', apply_sqlite_pragmas)
+
+password_hasher = PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+    timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+)
+
+sql_metrics = SQLInstrumentation()
+if app.config['SQL_INSTRUMENTATION']:
+    with app.app_context():
+        sql_metrics.init_app(app, db.engine)
+broker = create_broker(app.config['MESSAGE_BROKER_URL'])
+
+def archive_path():
+    if app.config['ARCHIVE_PATH']:
+        return app.config['ARCHIVE_PATH']
+    database = db.engine.url.database
+    directory = os.path.dirname(database) if database and database != ':memory:' else app.root_path
+    return os.path.join(directory, 'archive.db')
+
 with app.app_context():
-    try:
-        ui_module = app.jinja_env.get_template('macros/macros.html').make_module({})
-        app.jinja_env.globals['ui'] = ui_module
-    except Exception:
-        # If macros are missing during early import, continue; templates may import directly
-        pass
+    archive = Archive(archive_path(), level=app.config['ARCHIVE_COMPRESS_LEVEL'])
+compressor = Compressor(app)
+asset_manifest = AssetManifest(app.static_folder)
+
+def asset_url(endpoint, **values):
+    """url_for() that resolves static files to their fingerprinted, cacheable URLs."""
+    return asset_manifest.url(url_for, endpoint, **values)
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+def render_version():
+    """Digest of the code, templates and assets that shape rendered pages (part of every page ETag)."""
+    digest = hashlib.sha1(json.dumps(asset_manifest.files, sort_keys=True).encode())
+    paths = [os.path.abspath(__file__)]
+    for root, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        paths += [os.path.join(root, name) for name in files]
+    for path in sorted(paths):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+RENDER_VERSION = render_version()
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    # Only fingerprinted names are served, so a URL's content never changes
+    if filename not in asset_manifest.hashed:
+        abort(404)
+    path, encoding = asset_manifest.encoded(filename, request.accept_encodings)
+    response = send_from_directory(asset_manifest.dist_dir, path, mimetype=asset_manifest.mimetype(filename),
+                                   max_age=app.config['ASSET_MAX_AGE'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
 
 class FormData(db.Model):
+    __table_args__ = (
+        db.Index('ix_form_data_email', 'email', 'id'),
+        db.Index('ix_form_data_created_at', 'created_at'),
+        # Ids of archived rows are never handed out again (see migration_autoincrement_ids)
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
     email = db.Column(db.String(128), nullable=False)
     gender = db.Column(db.String(10), nullable=False)
     message = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # NULL u záznamů starších než sloupec
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -38,14 +218,131 @@ class User(db.Model):
     email = db.Column(db.String(128), nullable=False)
     gender = db.Column(db.String(10), nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
+    unread_total = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # = SUM(conversation.unread_count), kept incrementally
+
+# Uniqueness is enforced by the database: username has a UNIQUE constraint and
+# e-mails are unique after normalization (case and surrounding whitespace)
+db.Index('ux_user_email_normalized', db.func.lower(db.func.trim(User.email)), unique=True)
+
+def normalize_email(email):
+    return email.strip().lower()
 
 class Message(db.Model):
+    # Keyset pagination of a thread is a range scan per direction on this index
+    __table_args__ = (
+        db.Index('ix_message_pair_time', 'sender_id', 'receiver_id', 'created_at', 'id'),
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+class AdminJob(db.Model):
+    # Progress of background admin jobs; stored in the DB so every worker can report it
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued/running/done/failed
+    total = db.Column(db.Integer, nullable=False, default=0)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime)  # heartbeat, refreshed with every committed chunk
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {"id": self.id, "kind": self.kind, "status": self.status, "total": self.total, "done": self.done, "error": self.error}
+
+# Materialized inbox: one row per (owner, peer) pair, kept in sync on every send.
+# Each pair is stored twice (once per participant) so the inbox is a single
+# range scan over ix_conversation_user_time instead of a pass over all messages.
+PREVIEW_LENGTH = 200
+
+class Conversation(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'peer_id', name='uq_conversation_pair'),
+        db.Index('ix_conversation_user_time', 'user_id', 'last_message_at'),
+        # Only conversations with unread messages: the unread endpoint never touches the rest
+        db.Index('ix_conversation_unread', 'user_id', sqlite_where=db.text('unread_count > 0')),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    peer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('message.id'), nullable=False)
+    last_sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    preview = db.Column(db.String(PREVIEW_LENGTH), nullable=False)
+    last_message_at = db.Column(db.DateTime, nullable=False)
+    # Read state of the owner: read receipt marker and counter of newer messages from the peer
+    last_read_message_id = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    peer = db.relationship('User', foreign_keys=[peer_id])
+
+# Per-process cache of user records (immutable snapshots, never ORM instances,
+# so they are safe to share between requests and threads)
+CachedUser = namedtuple('CachedUser', 'id username email gender')
+user_cache = TTLCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+def cache_user(user):
+    snapshot = CachedUser(user.id, user.username, user.email, user.gender)
+    user_cache.set(('id', snapshot.id), snapshot)
+    user_cache.set(('username', snapshot.username), snapshot)
+    return snapshot
+
+def get_user(user_id):
+    cached = user_cache.get(('id', user_id))
+    if cached is not None:
+        return cached
+    user = db.session.get(User, user_id)
+    return cache_user(user) if user else None
+
+def get_user_by_username(username):
+    cached = user_cache.get(('username', username))
+    if cached is not None:
+        return cached
+    user = User.query.filter_by(username=username).first()
+    return cache_user(user) if user else None
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    user_cache.pop(('id', target.id))
+    user_cache.pop(('username', target.username))
+    for old_name in db.inspect(target).attrs.username.history.deleted:
+        user_cache.pop(('username', old_name))
+
+def current_user():
+    """Logged-in user for this request, resolved at most once (cached on `g`)."""
+    if 'current_user' not in g:
+        user = None
+        if session.get('user_id'):
+            user = get_user(session['user_id'])
+        elif session.get('user'):
+            # Sessions created before user_id was stored
+            user = get_user_by_username(session['user'])
+            if user:
+                session['user_id'] = user.id
+        g.current_user = user
+    return g.current_user
+
+def unread_total():
+    """Unread messages of the logged-in user for the navbar badge (one primary-key lookup)."""
+    if 'unread_total' not in g:
+        me = current_user()
+        g.unread_total = (db.session.query(User.unread_total).filter(User.id == me.id).scalar() or 0) if me else 0
+    return g.unread_total
+
+app.jinja_env.globals['unread_total'] = unread_total
+
+# Preload Jinja macros and expose as global `ui` for templates
+with app.app_context():
+    try:
+        ui_module = app.jinja_env.get_template('macros/macros.html').make_module({})
+        app.jinja_env.globals['ui'] = ui_module
+    except Exception:
+        # If macros are missing during early import, continue; templates may import directly
+        pass
+
 class MyForm(FlaskForm):
     name = StringField('Jméno', validators=[DataRequired(message="Jméno je povinné")])
     email = StringField('Email', validators=[DataRequired(message="Email je povinný"), Email(message="Neplatný email")])
@@ -65,14 +362,6 @@ class RegisterForm(FlaskForm):
     password = PasswordField('Heslo', validators=[DataRequired(message="Heslo je povinné")])
     submit = SubmitField('Registrovat')
 
-    def validate_username(self, field):
-        if User.query.filter_by(username=field.data).first():
-            raise ValidationError('Uživatelské jméno je již použito')
-
-    def validate_email(self, field):
-        if User.query.filter_by(email=field.data).first():
-            raise ValidationError('Email je již použit')
-
 class MessageForm(FlaskForm):
     message = TextAreaField('Zpráva', validators=[DataRequired(message="Zpráva je povinná")])
     submit = SubmitField('Odeslat')
@@ -88,8 +377,8 @@ TEMPLATE = '''
         <meta charset="utf-8">
         <meta name="viewport" content="width=device-width, initial-scale=1">
         <title>Validovaný formulář</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css" rel="stylesheet">
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.css" rel="stylesheet">
+        <link href="{{ asset_url('static', filename='vendor/bootstrap/css/bootstrap.min.css') }}" rel="stylesheet">
+        <link href="{{ asset_url('static', filename='vendor/bootstrap-icons/bootstrap-icons.min.css') }}" rel="stylesheet">
         <style>
             body {
                 min-height: 100vh;
@@ -209,7 +498,7 @@ TEMPLATE = '''
                 </div>
             </div>
         </div>
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js"></script>
+        <script src="{{ asset_url('static', filename='vendor/bootstrap/js/bootstrap.bundle.min.js') }}"></script>
         <script>
             // Počítadlo znaků pro textarea
             const ta = document.getElementById('message');
@@ -238,39 +527,70 @@ TEMPLATE = '''
     </html>
 '''
 
+def flush_form_batch(rows):
+    """Insert a batch of submissions with one multi-row INSERT and one commit."""
+    with app.app_context():
+        try:
+            db.session.execute(FormData.__table__.insert().values(rows))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+ingest_writer = BatchWriter(
+    flush_form_batch,
+    batch_size=app.config['INGEST_BATCH_SIZE'],
+    flush_interval=app.config['INGEST_FLUSH_INTERVAL'],
+    max_queue=app.config['INGEST_QUEUE_SIZE'],
+    enqueue_timeout=app.config['INGEST_ENQUEUE_TIMEOUT'],
+)
+
+def save_form_entry(name, email, gender, message):
+    """Store one submission: 'saved', 'pending' (queued, write not confirmed within
+    INGEST_COMMIT_TIMEOUT) or 'rejected' (buffer full or the batch failed; safe to resubmit)."""
+    row = dict(name=name, email=email, gender=gender, message=message, created_at=datetime.utcnow())
+    if app.config['INGEST_MODE'] != 'buffered':
+        db.session.add(FormData(**row))
+        db.session.commit()
+        return 'saved'
+    try:
+        ticket = ingest_writer.submit(row)
+    except QueueFull:
+        return 'rejected'
+    if app.config['INGEST_DURABILITY'] == 'commit' and not ticket.wait(timeout=app.config['INGEST_COMMIT_TIMEOUT']):
+        return 'pending' if ticket.pending else 'rejected'
+    return 'saved'
+
+def form_saved_response(status, form, success_message):
+    if status == 'rejected':
+        flash('Server je přetížený, zkuste to prosím znovu', 'danger')
+        return render_template('sites/index.html', form=form), 503
+    if status == 'pending':
+        # The row is still queued and will be written; resubmitting would duplicate it
+        flash('Zpráva byla přijata a ukládá se, neodesílejte ji prosím znovu', 'info')
+    else:
+        flash(success_message, 'success')
+    return redirect(url_for('index'))
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if session.get('user'):
         form = MessageForm()
         if form.validate_on_submit():
-            user = User.query.filter_by(username=session['user']).first()
+            user = current_user()
             if not user:
                 flash('Uživatel nenalezen', 'danger')
                 return redirect(url_for('logout'))
-            new_entry = FormData(
-                name=user.username,
-                email=user.email,
-                gender=user.gender,
-                message=form.message.data
-            )
-            db.session.add(new_entry)
-            db.session.commit()
-            flash('Zpráva úspěšně odeslána', 'success')
-            return redirect(url_for('index'))
+            status = save_form_entry(user.username, user.email, user.gender, form.message.data)
+            return form_saved_response(status, form, 'Zpráva úspěšně odeslána')
         return render_template('sites/index.html', form=form)
     else:
         form = MyForm()
         if form.validate_on_submit():
-            new_entry = FormData(
-                name=form.name.data,
-                email=form.email.data,
-                gender=form.gender.data,
-                message=form.message.data
-            )
-            db.session.add(new_entry)
-            db.session.commit()
-            flash('Formulář úspěšně odeslán', 'success')
-            return redirect(url_for('index'))
+            status = save_form_entry(form.name.data, form.email.data, form.gender.data, form.message.data)
+            return form_saved_response(status, form, 'Formulář úspěšně odeslán')
         return render_template('sites/index.html', form=form)
 
 # Login template moved to templates/auth/login_admin.html
@@ -283,7 +603,7 @@ ADMIN_TEMPLATE = '''
         <meta charset="utf-8">
         <meta name="viewport" content="width=device-width, initial-scale=1">
         <title>Admin - zprávy</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css" rel="stylesheet">
+        <link href="{{ asset_url('static', filename='vendor/bootstrap/css/bootstrap.min.css') }}" rel="stylesheet">
     </head>
     <body>
             <nav class="navbar navbar-light bg-light border-bottom">
@@ -359,14 +679,242 @@ def login_admin():
 def logout():
     session.pop('admin', None)
     session.pop('user', None)
+    session.pop('user_id', None)
     return redirect(url_for('index'))
 
+ADMIN_FILTERS = ('name', 'email', 'gender', 'q')
+EXPORT_COLUMNS = ('id', 'name', 'email', 'gender', 'message')
+
+def admin_filters(args):
+    """Active admin filters from query args and the matching FormData criteria."""
+    active = {key: args.get(key, '').strip() for key in ADMIN_FILTERS}
+    active = {key: value for key, value in active.items() if value}
+    criteria = []
+    if 'name' in active:
+        criteria.append(FormData.name.like(escape_like(active['name']) + '%', escape='\\'))
+    if 'email' in active:
+        criteria.append(FormData.email == active['email'])
+    if 'gender' in active:
+        criteria.append(FormData.gender == active['gender'])
+    if 'q' in active:
+        criteria.append(form_text_criterion(active['q']))
+    return active, criteria
+
+def parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
 @app.route('/admin')
 def admin():
     if not require_admin():
         return redirect(url_for('login_admin'))
-    items = FormData.query.order_by(FormData.id.asc()).all()
-    return render_template('sites/admin.html', items=items)
+    filters, criteria = admin_filters(request.args)
+    fail_stale_jobs()
+    jobs = AdminJob.query.order_by(AdminJob.created_at.desc()).limit(5).all()
+    scope = 'messages' if request.args.get('scope') == 'messages' else 'forms'
+    if 'q' in filters and app.config['FULLTEXT_SEARCH']:
+        # Ranked full-text results (forms, or every chat message) with keyset pages on (score, id)
+        cursor = fulltext.decode_cursor(request.args.get('cursor'))
+        if scope == 'messages':
+            hits, next_cursor = search_messages(filters['q'], cursor=cursor)
+        else:
+            _, criteria = admin_filters({k: v for k, v in filters.items() if k != 'q'})
+            hits, next_cursor = ranked_search(FormData, 'form_search', match_expression(filters['q']), criteria, cursor)
+        first_url = url_for('admin', scope=scope, **filters) if cursor else None
+        next_url = url_for('admin', scope=scope, cursor=next_cursor, **filters) if next_cursor else None
+        return render_template('sites/admin.html', items=[hit for hit, _ in hits] if scope == 'forms' else [], hits=hits, scope=scope,
+                               snippets={hit.id: snip for hit, snip in hits} if scope == 'forms' else None,
+                               filters=filters, prev_url=first_url, next_url=next_url, jobs=jobs, users=get_user)
+    page_size = app.config['ADMIN_PAGE_SIZE']
+    after = parse_id(request.args.get('after'))
+    before = parse_id(request.args.get('before'))
+    q = FormData.query.filter(*criteria)
+    if before is not None:
+        # Previous page: walk backwards from the cursor, then restore ascending order
+        items = q.filter(FormData.id < before).order_by(FormData.id.desc()).limit(page_size + 1).all()
+        has_prev = len(items) > page_size
+        items = list(reversed(items[:page_size]))
+        has_next = True
+    else:
+        if after is not None:
+            q = q.filter(FormData.id > after)
+        items = q.order_by(FormData.id.asc()).limit(page_size + 1).all()
+        has_next = len(items) > page_size
+        items = items[:page_size]
+        has_prev = after is not None
+    prev_url = url_for('admin', before=items[0].id, **filters) if items and has_prev else None
+    next_url = url_for('admin', after=items[-1].id, **filters) if items and has_next else None
+    return render_template('sites/admin.html', items=items, filters=filters, prev_url=prev_url, next_url=next_url, jobs=jobs, scope=scope)
+
+def export_rows(criteria, fmt):
+    """Yield export chunks batch by batch (keyset on id), so memory stays constant
+    and each batch reads in its own short transaction."""
+    batch_size = app.config['EXPORT_BATCH_SIZE']
+    last_id = 0
+    if fmt == 'csv':
+        buf = io.StringIO()
+        csv.writer(buf).writerow(EXPORT_COLUMNS)
+        yield buf.getvalue()
+    while True:
+        rows = (
+            db.session.query(*(getattr(FormData, col) for col in EXPORT_COLUMNS))
+            .filter(FormData.id > last_id, *criteria)
+            .order_by(FormData.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        # End the read transaction before the client consumes the batch: a snapshot held
+        # for the whole download would block WAL checkpoints (the keyset needs no snapshot)
+        db.session.commit()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        buf = io.StringIO()
+        if fmt == 'csv':
+            csv.writer(buf).writerows(rows)
+        else:
+            for row in rows:
+                buf.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n')
+        yield buf.getvalue()
+
+@app.route('/admin/export.<fmt>')
+def admin_export(fmt):
+    if not require_admin():
+        return redirect(url_for('login_admin'))
+    mimetypes = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+    if fmt not in mimetypes:
+        abort(404)
+    _, criteria = admin_filters(request.args)
+    return Response(
+        stream_with_context(export_rows(criteria, fmt)),
+        mimetype=mimetypes[fmt],
+        headers={'Content-Disposition': f'attachment; filename=formdata.{fmt}'},
+    )
+
+def parse_date(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def bulk_delete_criteria(args):
+    """FormData criteria for a bulk delete; empty list means nothing was selected."""
+    _, criteria = admin_filters(args)
+    ids = [i for i in (parse_id(v) for v in args.getlist('ids')) if i is not None]
+    if ids:
+        criteria.append(FormData.id.in_(ids))
+    id_from, id_to = parse_id(args.get('id_from')), parse_id(args.get('id_to'))
+    if id_from is not None:
+        criteria.append(FormData.id >= id_from)
+    if id_to is not None:
+        criteria.append(FormData.id <= id_to)
+    created_after, created_before = parse_date(args.get('created_after')), parse_date(args.get('created_before'))
+    if created_after:
+        criteria.append(FormData.created_at >= created_after)
+    if created_before:
+        criteria.append(FormData.created_at < created_before)
+    return criteria
+
+def delete_in_chunks(criteria, job=None):
+    """Set-based DELETE in chunks, committing after each so the write lock is held briefly.
+
+    Each chunk continues after the last deleted id, so rows that do not match a
+    non-indexed filter are scanned once, not once per chunk.
+    """
+    chunk = app.config['BULK_DELETE_CHUNK']
+    deleted = last_id = 0
+    while True:
+        ids = [row[0] for row in db.session.query(FormData.id).filter(*criteria, FormData.id > last_id)
+               .order_by(FormData.id).limit(chunk)]
+        if not ids:
+            break
+        FormData.query.filter(FormData.id.in_(ids)).delete(synchronize_session=False)
+        deleted += len(ids)
+        last_id = ids[-1]
+        if job is not None:
+            job.done, job.updated_at = deleted, datetime.utcnow()
+        db.session.commit()
+    return deleted
+
+def fail_stale_jobs():
+    """Mark jobs without a heartbeat for ADMIN_JOB_STALE_SECONDS as failed.
+
+    Jobs run on daemon threads of the worker that accepted them and do not
+    survive a worker restart or recycle; this keeps them from showing
+    `running` forever.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config['ADMIN_JOB_STALE_SECONDS'])
+    stale = AdminJob.query.filter(
+        AdminJob.status.in_(('queued', 'running')),
+        db.func.coalesce(AdminJob.updated_at, AdminJob.created_at) < cutoff,
+    )
+    # Called on every admin view and job poll: only take the write lock when there is something to fail
+    if not db.session.query(stale.exists()).scalar():
+        return 0
+    count = stale.update({'status': 'failed', 'error': 'Interrupted (worker restarted)', 'finished_at': datetime.utcnow()},
+                         synchronize_session=False)
+    db.session.commit()
+    return count
+
+def run_admin_job(job_id, work):
+    """Run `work(job)` on a daemon thread, recording status in AdminJob."""
+    def target():
+        with app.app_context():
+            job = db.session.get(AdminJob, job_id)
+            job.status, job.updated_at = 'running', datetime.utcnow()
+            db.session.commit()
+            try:
+                work(job)
+                job.status = 'done'
+            except Exception as exc:
+                db.session.rollback()
+                job = db.session.get(AdminJob, job_id)
+                job.status, job.error = 'failed', str(exc)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            db.session.remove()
+    threading.Thread(target=target, name=f'admin-job-{job_id}', daemon=True).start()
+
+@app.route('/admin/delete', methods=['POST'])
+def bulk_delete():
+    """Delete FormData by ids, id range, email/name/gender or date; large purges run in background."""
+    if not require_admin():
+        return redirect(url_for('login_admin'))
+    args = request.form
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+        args = MultiDict([(k, v) for k, vals in payload.items() for v in (vals if isinstance(vals, list) else [vals])])
+    criteria = bulk_delete_criteria(args)
+    if not criteria:
+        if request.is_json:
+            return jsonify(error='No selection'), 400
+        flash('Nebyl vybrán žádný záznam', 'danger')
+        return redirect(url_for('admin'))
+    total = db.session.query(db.func.count(FormData.id)).filter(*criteria).scalar()
+    if total > app.config['BULK_DELETE_ASYNC_THRESHOLD'] or args.get('background') == '1':
+        job = AdminJob(id=uuid.uuid4().hex, kind='bulk_delete', total=total)
+        db.session.add(job)
+        db.session.commit()
+        run_admin_job(job.id, lambda j: delete_in_chunks(criteria, job=j))
+        if request.is_json:
+            return jsonify(job=job.to_dict(), status_url=url_for('admin_job', job_id=job.id)), 202
+        flash(f'Mazání {total} záznamů běží na pozadí', 'success')
+        return redirect(url_for('admin'))
+    deleted = delete_in_chunks(criteria)
+    if request.is_json:
+        return jsonify(deleted=deleted)
+    flash(f'Smazáno záznamů: {deleted}', 'success')
+    return redirect(url_for('admin'))
+
+@app.route('/admin/jobs/<job_id>')
+def admin_job(job_id):
+    if not require_admin():
+        abort(401)
+    fail_stale_jobs()
+    job = AdminJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
 
 @app.route('/delete/<int:entry_id>', methods=['POST'])
 def delete_entry(entry_id):
@@ -377,98 +925,675 @@ def delete_entry(entry_id):
     db.session.commit()
     return redirect(url_for('admin'))
 
+def record_conversation(msg):
+    """Upsert both inbox rows of the message's pair in the caller's transaction.
+
+    The receiver's unread counters (per conversation and the user total) grow
+    by one here, so reading them never needs a COUNT over `message`.
+    """
+    rows = [
+        dict(user_id=msg.sender_id, peer_id=msg.receiver_id, unread_count=0, last_read_message_id=msg.id),
+        dict(user_id=msg.receiver_id, peer_id=msg.sender_id, unread_count=1, last_read_message_id=0),
+    ]
+    for row in rows:
+        row.update(
+            last_message_id=msg.id,
+            last_sender_id=msg.sender_id,
+            preview=msg.content[:PREVIEW_LENGTH],
+            last_message_at=msg.created_at,
+        )
+    stmt = sqlite_insert(Conversation.__table__).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'peer_id'],
+        set_=dict(
+            {col: stmt.excluded[col] for col in ('last_message_id', 'last_sender_id', 'preview', 'last_message_at')},
+            unread_count=Conversation.__table__.c.unread_count + stmt.excluded.unread_count,
+        ),
+    )
+    db.session.execute(stmt)
+    db.session.execute(
+        User.__table__.update().where(User.__table__.c.id == msg.receiver_id)
+        .values(unread_total=User.__table__.c.unread_total + 1)
+    )
+
+def mark_conversation_read(me, other):
+    """Reset `me`'s unread counter for `other` and move the read receipt; commits.
+
+    Returns the new read marker, or None when nothing was unread.
+    """
+    row = db.session.query(Conversation.id, Conversation.unread_count, Conversation.last_message_id) \
+        .filter_by(user_id=me.id, peer_id=other.id).first()
+    if row is None or not row.unread_count:
+        return None
+    # Conditional on the counter we read: a message arriving meanwhile keeps it unread
+    updated = db.session.execute(
+        Conversation.__table__.update()
+        .where(Conversation.__table__.c.id == row.id, Conversation.__table__.c.unread_count == row.unread_count)
+        .values(unread_count=0, last_read_message_id=row.last_message_id)
+    ).rowcount
+    if updated:
+        db.session.execute(
+            User.__table__.update().where(User.__table__.c.id == me.id)
+            .values(unread_total=db.func.max(User.__table__.c.unread_total - row.unread_count, 0))
+        )
+    db.session.commit()
+    if not updated:
+        return None
+    g.pop('unread_total', None)
+    publish_event(f'user:{other.id}', {"type": "read", "reader_id": me.id, "last_read_id": row.last_message_id})
+    return row.last_message_id
+
+def peer_read_marker(me, other):
+    """Id of the newest message `other` has read in the conversation with `me` (read receipts)."""
+    return db.session.query(Conversation.last_read_message_id) \
+        .filter_by(user_id=other.id, peer_id=me.id).scalar() or 0
+
+
+def load_contacts(me):
+    """Inbox entries for `me`, newest conversation first (cost ~ number of contacts)."""
+    rows = (
+        Conversation.query.options(joinedload(Conversation.peer))
+        .filter_by(user_id=me.id)
+        .order_by(Conversation.last_message_at.desc())
+        .all()
+    )
+    return [
+        {"user": c.peer, "preview": c.preview, "time": c.last_message_at, "from_me": c.last_sender_id == me.id, "unread": c.unread_count}
+        for c in rows
+    ]
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_users(q, exclude_id=None, limit=None):
+    """Users matching `q`, ranked exact, then prefix, then substring.
+
+    Every step is an index lookup capped at `limit`: exact and prefix matches use
+    ix_user_username_nocase (LIKE 'q%' is index-backed under NOCASE), substring
+    matches the trigram FTS5 table user_search when it is available.
+    """
+    limit = limit or app.config['USER_SEARCH_LIMIT']
+    q = q.strip()[:128]
+    found, seen = [], {exclude_id}
+
+    def take(users):
+        for u in users:
+            if len(found) >= limit:
+                break
+            if u.id not in seen:
+                seen.add(u.id)
+                found.append(u)
+
+    if not q:
+        return found
+    nocase = User.username.collate('NOCASE')
+    take(User.query.filter(nocase == q).limit(2))
+    if len(found) < limit:
+        take(User.query.filter(User.username.like(escape_like(q) + '%', escape='\\')).order_by(nocase).limit(limit + 2))
+    if len(found) < limit and len(q) >= 3 and app.config['USER_SEARCH_TRIGRAM']:
+        phrase = '"' + q.replace('"', '""') + '"'
+        ids = [row[0] for row in db.session.execute(
+            text("SELECT rowid FROM user_search WHERE user_search MATCH :phrase LIMIT :n"),
+            {"phrase": phrase, "n": limit + len(seen)},
+        )]
+        if ids:
+            take(User.query.filter(User.id.in_(ids)).order_by(nocase).all())
+    return found
+
+def ensure_user_search_index():
+    """Create the trigram FTS5 index over user.username and its sync triggers."""
+    exists = db.session.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'user_search'")).first()
+    db.session.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+        "username, content='user', content_rowid='id', tokenize='trigram')"
+    ))
+    db.session.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS user_search_ai AFTER INSERT ON user BEGIN "
+        "INSERT INTO user_search (rowid, username) VALUES (new.id, new.username); END"
+    ))
+    db.session.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS user_search_ad AFTER DELETE ON user BEGIN "
+        "INSERT INTO user_search (user_search, rowid, username) VALUES ('delete', old.id, old.username); END"
+    ))
+    db.session.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS user_search_au AFTER UPDATE OF username ON user BEGIN "
+        "INSERT INTO user_search (user_search, rowid, username) VALUES ('delete', old.id, old.username); "
+        "INSERT INTO user_search (rowid, username) VALUES (new.id, new.username); END"
+    ))
+    if not exists:
+        db.session.execute(text("INSERT INTO user_search (user_search) VALUES ('rebuild')"))
+    db.session.commit()
+
+# Full-text search (FTS5, external content: the index stores no second copy of
+# the text). message_search reads a view that adds an `owners` column
+# ("u<sender> u<receiver>"), so scoping a search to one user's conversations
+# is an FTS doclist intersection instead of a post-filter over all hits.
+MESSAGE_OWNERS = "'u' || {row}.sender_id || ' u' || {row}.receiver_id"
+FULLTEXT_TOKENIZER = "unicode61 remove_diacritics 2"  # "zprava" finds "zpráva"
+
+def ensure_fulltext_index():
+    """Create the FTS5 indexes over message.content and form_data.message with their sync triggers."""
+    created = db.session.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'message_search'")).first() is None
+    statements = [
+        f"CREATE VIEW IF NOT EXISTS message_search_source AS "
+        f"SELECT id, content, {MESSAGE_OWNERS.format(row='message')} AS owners FROM message",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5("
+        f"content, owners, content='message_search_source', content_rowid='id', tokenize='{FULLTEXT_TOKENIZER}')",
+        f"CREATE TRIGGER IF NOT EXISTS message_search_ai AFTER INSERT ON message BEGIN "
+        f"INSERT INTO message_search (rowid, content, owners) VALUES (new.id, new.content, {MESSAGE_OWNERS.format(row='new')}); END",
+        f"CREATE TRIGGER IF NOT EXISTS message_search_ad AFTER DELETE ON message BEGIN "
+        f"INSERT INTO message_search (message_search, rowid, content, owners) "
+        f"VALUES ('delete', old.id, old.content, {MESSAGE_OWNERS.format(row='old')}); END",
+        f"CREATE TRIGGER IF NOT EXISTS message_search_au AFTER UPDATE OF content, sender_id, receiver_id ON message BEGIN "
+        f"INSERT INTO message_search (message_search, rowid, content, owners) "
+        f"VALUES ('delete', old.id, old.content, {MESSAGE_OWNERS.format(row='old')}); "
+        f"INSERT INTO message_search (rowid, content, owners) VALUES (new.id, new.content, {MESSAGE_OWNERS.format(row='new')}); END",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS form_search USING fts5("
+        f"message, content='form_data', content_rowid='id', tokenize='{FULLTEXT_TOKENIZER}')",
+        "CREATE TRIGGER IF NOT EXISTS form_search_ai AFTER INSERT ON form_data BEGIN "
+        "INSERT INTO form_search (rowid, message) VALUES (new.id, new.message); END",
+        "CREATE TRIGGER IF NOT EXISTS form_search_ad AFTER DELETE ON form_data BEGIN "
+        "INSERT INTO form_search (form_search, rowid, message) VALUES ('delete', old.id, old.message); END",
+        "CREATE TRIGGER IF NOT EXISTS form_search_au AFTER UPDATE OF message ON form_data BEGIN "
+        "INSERT INTO form_search (form_search, rowid, message) VALUES ('delete', old.id, old.message); "
+        "INSERT INTO form_search (rowid, message) VALUES (new.id, new.message); END",
+    ]
+    for statement in statements:
+        db.session.execute(text(statement))
+    db.session.commit()
+    if created:
+        rebuild_fulltext_index()
+
+def rebuild_fulltext_index():
+    """Re-read both FTS5 indexes from their content tables and merge their segments."""
+    for table in ('message_search', 'form_search'):
+        db.session.execute(text(f"INSERT INTO {table} ({table}) VALUES ('rebuild')"))
+        db.session.execute(text(f"INSERT INTO {table} ({table}) VALUES ('optimize')"))
+    db.session.commit()
+
+def form_text_criterion(q):
+    """FormData criterion for the admin text filter (FTS5 when available, LIKE otherwise)."""
+    expr = match_expression(q)
+    if expr and app.config['FULLTEXT_SEARCH']:
+        return FormData.id.in_(
+            db.select(db.column('rowid')).select_from(db.table('form_search'))
+            .where(db.literal_column('form_search').op('MATCH')(expr))
+        )
+    return FormData.message.like('%' + escape_like(q) + '%', escape='\\')
+
+def ranked_search(model, fts_table, expr, criteria=(), cursor=None, weights=()):
+    """One page of `model` rows matching FTS5 `expr`, best bm25 first.
+
+    Returns ([(row, highlighted snippet)], next cursor). Pages continue after
+    the (score, id) of the previous page's last hit, so no OFFSET is needed.
+    """
+    if not expr:
+        return [], None
+    page_size = app.config['SEARCH_PAGE_SIZE']
+    fts = db.table(fts_table, db.column('rowid'))
+    fts_ref = db.literal_column(fts_table)
+    score = db.func.bm25(fts_ref, *weights)
+    snippet = db.func.snippet(fts_ref, 0, HIGHLIGHT_START, HIGHLIGHT_END, '…', 16)
+    q = (
+        db.session.query(model, score.label('score'), snippet.label('snippet'))
+        .select_from(fts)
+        .join(model, model.id == fts.c.rowid)
+        .filter(fts_ref.op('MATCH')(expr), *criteria)
+    )
+    if cursor is not None:
+        q = q.filter(or_(score > cursor[0], db.and_(score == cursor[0], model.id > cursor[1])))
+    rows = q.order_by(score, model.id).limit(page_size + 1).all()
+    next_cursor = fulltext.encode_cursor(rows[page_size - 1].score, rows[page_size - 1][0].id) if len(rows) > page_size else None
+    return [(row, highlight(snip)) for row, _, snip in rows[:page_size]], next_cursor
+
+def search_messages(q, user_id=None, cursor=None):
+    """Ranked chat messages matching `q`; with `user_id` only that user's conversations."""
+    expr = match_expression(q)
+    if not expr or not app.config['FULLTEXT_SEARCH']:
+        return [], None
+    if user_id is not None:
+        expr = f'content : ({expr}) AND owners : "u{int(user_id)}"'
+    return ranked_search(Message, 'message_search', expr, cursor=cursor, weights=(1.0, 0.0))
+
+def publish_event(channel, event):
+    """Best-effort live delivery: the change is already committed, so a broker failure
+    (e.g. the SQLite event log busy past its timeout) is logged, not turned into a 500;
+    the page shows the data on the next load."""
+    try:
+        broker.publish(channel, event)
+    except Exception:
+        app.logger.exception('Publishing to %s failed', channel)
+
+def publish_message(msg, sender, receiver):
+    """Push a committed message to the live streams of both participants."""
+    event = {
+        "id": msg.id,
+        "sender_id": sender.id,
+        "sender": sender.username,
+        "receiver_id": receiver.id,
+        "receiver": receiver.username,
+        "content": msg.content,
+        "preview": msg.content[:PREVIEW_LENGTH],
+        "time": msg.created_at.strftime('%d.%m.%Y %H:%M'),
+    }
+    for user_id in (receiver.id, sender.id):
+        publish_event(f'user:{user_id}', event)
+
+def encode_cursor(msg):
+    return f"{msg.created_at.isoformat()},{msg.id}"
+
+def decode_cursor(value):
+    """Parse a `created_at,id` cursor; returns None for missing or malformed input."""
+    try:
+        ts, msg_id = value.rsplit(',', 1)
+        return datetime.fromisoformat(ts), int(msg_id)
+    except (AttributeError, ValueError):
+        return None
+
+def load_thread_page(me, other, before=None, limit=None):
+    """Newest `limit` messages between two users older than the `before` cursor.
+
+    Each direction is fetched separately so both queries stay bounded range scans
+    on ix_message_pair_time; the two slices are merged in Python. Rows moved out by
+    the retention job come from the archive once the hot rows run out. Returns the
+    page in chronological order and whether older messages exist.
+    """
+    limit = limit or app.config['THREAD_PAGE_SIZE']
+    rows = []
+    for sender_id, receiver_id in ((me.id, other.id), (other.id, me.id)):
+        q = Message.query.filter(Message.sender_id == sender_id, Message.receiver_id == receiver_id)
+        if before:
+            q = q.filter(tuple_(Message.created_at, Message.id) < tuple_(*before))
+        rows.extend(q.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all())
+    rows.sort(key=lambda m: (m.created_at, m.id), reverse=True)
+    if len(rows) <= limit:
+        # Hot window exhausted: continue below the oldest hot row in the archive (read only on demand)
+        oldest = (rows[-1].created_at, rows[-1].id) if rows else before
+        rows.extend(archive.thread_page(me.id, other.id, before=oldest, limit=limit + 1 - len(rows)))
+    page = rows[:limit]
+    page.reverse()
+    return page, len(rows) > limit
+
+def rebuild_conversations():
+    """Recompute the conversation table from the full message history (all of it counts as read)."""
+    db.session.execute(text("DELETE FROM conversation"))
+    result = db.session.execute(text(
+        """
+        INSERT INTO conversation (user_id, peer_id, last_message_id, last_sender_id, preview, last_message_at, last_read_message_id, unread_count)
+        SELECT p.user_id, p.peer_id, m.id, m.sender_id, substr(m.content, 1, :preview_len), m.created_at, m.id, 0
+        FROM (
+            SELECT user_id, peer_id, MAX(id) AS last_id FROM (
+                SELECT sender_id AS user_id, receiver_id AS peer_id, id FROM message
+                UNION ALL
+                SELECT receiver_id AS user_id, sender_id AS peer_id, id FROM message
+            ) GROUP BY user_id, peer_id
+        ) AS p
+        JOIN message AS m ON m.id = p.last_id
+        """
+    ), {"preview_len": PREVIEW_LENGTH})
+    db.session.execute(text("UPDATE user SET unread_total = 0"))
+    db.session.commit()
+    return result.rowcount
+
+def retention_criterion(model, days, keep):
+    """Rows of `model` outside the retention policy (older than `days` or beyond the newest `keep`), or None."""
+    criteria = []
+    if days:
+        criteria.append(model.created_at < datetime.utcnow() - timedelta(days=days))
+        if model.__table__.c.created_at.nullable:
+            criteria.append(model.created_at.is_(None))  # rows older than the column itself
+    if keep:
+        boundary = db.session.query(model.id).order_by(model.id.desc()).offset(keep).limit(1).scalar()
+        if boundary is not None:
+            criteria.append(model.id <= boundary)
+    return or_(*criteria) if criteria else None
+
+def incremental_vacuum():
+    """Return up to RETENTION_VACUUM_PAGES free pages to the filesystem (needs auto_vacuum=INCREMENTAL)."""
+    pages = app.config['RETENTION_VACUUM_PAGES']
+    if not pages or db.session.execute(text("PRAGMA auto_vacuum")).scalar() != 2:  # 2 = INCREMENTAL
+        return 0
+    free = db.session.execute(text("PRAGMA freelist_count")).scalar()
+    db.session.commit()
+    # executescript() steps the pragma to completion; execute() would free a single page
+    db.session.connection().connection.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+    db.session.commit()
+    return min(free, pages)
+
+def archive_in_chunks(model, criterion, store, job=None):
+    """Move matching rows to the archive: each chunk is committed there by `store`
+    and only then deleted from the hot table, followed by an incremental vacuum."""
+    chunk = app.config['RETENTION_CHUNK']
+    columns = model.__table__.columns
+    moved = last_id = 0
+    while True:
+        rows = db.session.query(*columns).filter(criterion, model.id > last_id) \
+            .order_by(model.id).limit(chunk).all()
+        if not rows:
+            break
+        store([row._asdict() for row in rows])
+        model.query.filter(model.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        moved += len(rows)
+        last_id = rows[-1].id
+        if job is not None:
+            job.done = moved
+        db.session.commit()
+        incremental_vacuum()
+    return moved
+
+def retention_policies():
+    return (
+        (Message, retention_criterion(Message, app.config['MESSAGE_RETENTION_DAYS'], app.config['MESSAGE_RETENTION_KEEP']), archive.add_messages),
+        (FormData, retention_criterion(FormData, app.config['FORM_RETENTION_DAYS'], app.config['FORM_RETENTION_KEEP']), archive.add_forms),
+    )
+
+def run_retention(job=None):
+    """Apply the configured retention policies; returns moved rows per table.
+
+    Conversation rows are left alone, so the inbox still lists archived threads
+    and load_thread_page() reads their history from the archive.
+    """
+    return {
+        model.__tablename__: archive_in_chunks(model, criterion, store, job=job) if criterion is not None else 0
+        for model, criterion, store in retention_policies()
+    }
+
+def user_email_duplicates():
+    """Groups of users whose e-mails collide after normalization."""
+    rows = db.session.execute(text(
+        "SELECT lower(trim(email)) AS normalized, group_concat(username, ', ') "
+        "FROM user GROUP BY normalized HAVING COUNT(*) > 1"
+    )).fetchall()
+    return [(email, usernames) for email, usernames in rows]
+
+def ensure_user_unique_indexes():
+    """Add the normalized e-mail unique index unless existing duplicates prevent it."""
+    duplicates = user_email_duplicates()
+    if duplicates:
+        for email, usernames in duplicates:
+            app.logger.warning('Duplicate e-mail %s used by: %s', email, usernames)
+        app.logger.warning('ux_user_email_normalized not created: resolve %d duplicate e-mail(s) first', len(duplicates))
+        return duplicates
+    db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_user_email_normalized ON user (lower(trim(email)))"))
+    db.session.commit()
+    return duplicates
+
+_email_index_present = False
+
+def email_unique_index_present():
+    """Whether ux_user_email_normalized exists; cached once found (it is never dropped)."""
+    global _email_index_present
+    if not _email_index_present:
+        _email_index_present = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'ux_user_email_normalized'")).first() is not None
+    return _email_index_present
+
+def email_taken(email):
+    return db.session.query(User.id).filter(db.func.lower(db.func.trim(User.email)) == email).first() is not None
+
+@app.cli.command('migrate-user-uniqueness')
+def migrate_user_uniqueness_command():
+    """Create the user uniqueness indexes and report duplicates blocking them."""
+    duplicates = ensure_user_unique_indexes()
+    for email, usernames in duplicates:
+        print(f'Duplicate e-mail {email}: {usernames}')
+    print('ux_user_email_normalized: ' + ('blocked by duplicates' if duplicates else 'ok'))
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Create (if missing) and rebuild the full-text indexes over messages and forms."""
+    ensure_fulltext_index()
+    rebuild_fulltext_index()
+    counts = {table: db.session.execute(text(f"SELECT COUNT(*) FROM {table}_docsize")).scalar()
+              for table in ('message_search', 'form_search')}
+    print('Full-text index rebuilt: ' + ', '.join(f'{table}={count}' for table, count in counts.items()))
+
+@app.cli.command('retention')
+@click.option('--dry-run', is_flag=True, help='Only count the rows outside the retention policy.')
+def retention_command(dry_run):
+    """Move messages and form data outside the retention policy to the archive."""
+    if dry_run:
+        for model, criterion, _ in retention_policies():
+            count = db.session.query(db.func.count(model.id)).filter(criterion).scalar() if criterion is not None else 0
+            print(f'{model.__tablename__}: {count} row(s) to archive')
+        return
+    started = time.perf_counter()
+    moved = run_retention()
+    print('Archived ' + ', '.join(f'{table}={count}' for table, count in moved.items())
+          + f' to {archive.path} in {time.perf_counter() - started:.1f} s')
+
+@app.cli.command('export-archived-forms')
+def export_archived_forms_command():
+    """Write archived form submissions to stdout as NDJSON."""
+    for row in archive.iter_forms():
+        click.echo(json.dumps(row, ensure_ascii=False))
+
+@app.cli.command('backfill-conversations')
+def backfill_conversations_command():
+    """Rebuild the materialized inbox from existing messages."""
+    count = rebuild_conversations()
+    print(f'Conversation rows rebuilt: {count}')
+
+def inbox_etag(me, *parts):
+    """Weak ETag of the messaging pages for `me`: changes with the newest message they sent or received
+    and with their unread counters. None while flash messages are pending: the page rendering them
+    must neither be answered with a 304 nor be cached under a tag that a later visit would match."""
+    if session.get('_flashes'):
+        return None
+    # record_conversation() moves last_message_id on both sides of every new message
+    newest, unread = db.session.query(db.func.max(Conversation.last_message_id), db.func.sum(Conversation.unread_count)) \
+        .filter(Conversation.user_id == me.id).one()
+    raw = '|'.join(str(part) for part in (RENDER_VERSION, me.id, bool(session.get('admin')), newest or 0, unread or 0) + parts)
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+def revalidated(response, etag):
+    """Mark a private page as cacheable only with revalidation, tagging it with `etag`."""
+    response = make_response(response)
+    if etag:
+        response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def not_modified(etag):
+    """304 response when the client's If-None-Match already holds `etag`, else None."""
+    if etag and request.if_none_match.contains_weak(etag):
+        return revalidated(Response(status=304), etag)
+    return None
+
 @app.route('/messages', methods=['GET'])
 def messages():
     if not session.get('user'):
         return redirect(url_for('login'))
+    me = current_user()
+    # Search results depend on other users, so only the plain inbox is validated
+    etag = inbox_etag(me) if me and 'q' not in request.args and 'text' not in request.args else None
+    cached = not_modified(etag)
+    if cached:
+        return cached
     form = SearchForm(request.args)
-    me = User.query.filter_by(username=session['user']).first()
     results = []
-    # Build conversations list (users you've messaged with or who messaged you)
-    contacts = []
-    if me:
-        msgs = Message.query.filter(or_(Message.sender_id == me.id, Message.receiver_id == me.id)).order_by(Message.created_at.desc()).all()
-        latest_msg_map = {}
-        for m in msgs:
-            other_id = m.receiver_id if m.sender_id == me.id else m.sender_id
-            if other_id not in latest_msg_map:
-                latest_msg_map[other_id] = m
-        if latest_msg_map:
-            users = User.query.filter(User.id.in_(list(latest_msg_map.keys()))).all()
-            contacts = sorted(
-                (
-                    {"user": u, "preview": latest_msg_map[u.id].content, "time": latest_msg_map[u.id].created_at, "from_me": latest_msg_map[u.id].sender_id == me.id}
-                    for u in users
-                ),
-                key=lambda c: c["time"],
-                reverse=True,
-            )
-    if 'q' in request.args and form.validate():
-        q = form.q.data.strip()
-        if q:
-            results = User.query.filter(User.username.like(f"%{q}%"), User.username != session['user']).order_by(User.username.asc()).all()
-    return render_template('sites/messages.html', search=form, results=results, contacts=contacts, thread_user=None, messages=[], me_id=(me.id if me else None))
+    # Conversations list (users you've messaged with or who messaged you)
+    contacts = load_contacts(me) if me else []
+    if 'q' in request.args and form.validate() and me:
+        results = search_users(form.q.data, exclude_id=me.id)
+    # Full-text search in the user's own conversations
+    text_query = request.args.get('text', '').strip()[:200]
+    hits, hits_next_url = None, None
+    if text_query and me:
+        hits, next_cursor = search_messages(text_query, user_id=me.id, cursor=fulltext.decode_cursor(request.args.get('cursor')))
+        hits_next_url = url_for('messages', text=text_query, cursor=next_cursor) if next_cursor else None
+    page = render_template('sites/messages.html', search=form, results=results, contacts=contacts, thread_user=None, messages=[], me_id=(me.id if me else None),
+                           text_query=text_query, hits=hits, hits_next_url=hits_next_url, users=get_user)
+    return revalidated(page, etag)
 
 @app.route('/messages/<username>', methods=['GET', 'POST'])
 def messages_thread(username):
     if not session.get('user'):
         return redirect(url_for('login'))
-    me = User.query.filter_by(username=session['user']).first()
-    other = User.query.filter_by(username=username).first()
+    me = current_user()
+    other = get_user_by_username(username)
     if not other or not me or other.username == me.username:
         flash('Uživatel nenalezen', 'danger')
         return redirect(url_for('messages'))
 
+    if request.method == 'GET':
+        mark_conversation_read(me, other)  # opening the thread reads it
+    # The peer's marker drives the read receipts on my messages
+    peer_read_id = peer_read_marker(me, other)
+    etag = inbox_etag(me, other.id, peer_read_id) if request.method == 'GET' and 'q' not in request.args else None
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     send_form = MessageForm()
     if send_form.validate_on_submit():
-        msg = Message(sender_id=me.id, receiver_id=other.id, content=send_form.message.data.strip())
+        msg = Message(sender_id=me.id, receiver_id=other.id, content=send_form.message.data.strip(), created_at=datetime.utcnow())
         if msg.content:
             db.session.add(msg)
+            db.session.flush()  # assigns msg.id for the inbox row
+            record_conversation(msg)
             db.session.commit()
+            publish_message(msg, me, other)
             return redirect(url_for('messages_thread', username=other.username))
 
-    # Load conversation (both directions)
-    msgs = Message.query.filter(
-        or_(
-            and_(Message.sender_id == me.id, Message.receiver_id == other.id),
-            and_(Message.sender_id == other.id, Message.receiver_id == me.id)
-        )
-    ).order_by(Message.created_at.asc()).all()
+    # Load the newest page of the conversation (both directions); older pages via messages_history
+    msgs, has_more = load_thread_page(me, other)
 
     # Search form on the left (optional query) and conversations list
     search_form = SearchForm(request.args)
     results = []
     if 'q' in request.args and search_form.validate():
-        q = search_form.q.data.strip()
-        if q:
-            results = User.query.filter(User.username.like(f"%{q}%"), User.username != session['user']).order_by(User.username.asc()).all()
-    contacts = []
-    msgs_all = Message.query.filter(or_(Message.sender_id == me.id, Message.receiver_id == me.id)).order_by(Message.created_at.desc()).all()
-    latest_msg_map = {}
-    for m in msgs_all:
-        other_id = m.receiver_id if m.sender_id == me.id else m.sender_id
-        if other_id not in latest_msg_map:
-            latest_msg_map[other_id] = m
-    if latest_msg_map:
-        users = User.query.filter(User.id.in_(list(latest_msg_map.keys()))).all()
-        contacts = sorted(
-            (
-                {"user": u, "preview": latest_msg_map[u.id].content, "time": latest_msg_map[u.id].created_at, "from_me": latest_msg_map[u.id].sender_id == me.id}
-                for u in users
-            ),
-            key=lambda c: c["time"],
-            reverse=True,
-        )
+        results = search_users(search_form.q.data, exclude_id=me.id)
+    contacts = load_contacts(me)
+
+    older_cursor = encode_cursor(msgs[0]) if has_more else None
+    page = render_template('sites/messages.html', search=search_form, results=results, contacts=contacts, thread_user=other, messages=msgs, send_form=send_form, me_id=me.id, older_cursor=older_cursor, peer_read_id=peer_read_id)
+    return revalidated(page, etag)
 
-    return render_template('sites/messages.html', search=search_form, results=results, contacts=contacts, thread_user=other, messages=msgs, send_form=send_form, me_id=me.id)
+@app.route('/messages/unread', methods=['GET'])
+def messages_unread():
+    """JSON unread counters: total plus per contact, read from the maintained counters."""
+    if not session.get('user'):
+        abort(401)
+    me = current_user()
+    if not me:
+        abort(401)
+    rows = (
+        db.session.query(User.username, Conversation.unread_count)
+        .join(User, User.id == Conversation.peer_id)
+        .filter(Conversation.user_id == me.id, Conversation.unread_count > 0)
+        .all()
+    )
+    return jsonify(total=unread_total(), contacts={username: count for username, count in rows})
+
+@app.route('/messages/<username>/read', methods=['POST'])
+def messages_read(username):
+    """Mark the conversation with `username` as read (used when a live message arrives in the open thread)."""
+    if not session.get('user'):
+        abort(401)
+    me = current_user()
+    other = get_user_by_username(username)
+    if not other or not me or other.id == me.id:
+        abort(404)
+    last_read_id = mark_conversation_read(me, other)
+    return jsonify(last_read_id=last_read_id, total=unread_total())
+
+@app.route('/users/autocomplete', methods=['GET'])
+def users_autocomplete():
+    """JSON username suggestions for the search box."""
+    if not session.get('user'):
+        abort(401)
+    me = current_user()
+    users = search_users(request.args.get('q', ''), exclude_id=(me.id if me else None))
+    return jsonify(results=[{"username": u.username} for u in users])
+
+@app.route('/messages/stream', methods=['GET'])
+def messages_stream():
+    """Server-Sent Events stream of new messages for the logged-in user.
+
+    Usually served by the separate gevent stream server (stream.py), so the id
+    comes from the session cookie and opening a stream runs no query.
+    """
+    if not session.get('user'):
+        abort(401)
+    user_id = session.get('user_id')
+    if user_id is None:  # sessions from before user_id was stored
+        me = current_user()
+        if not me:
+            abort(401)
+        user_id = me.id
+    sub = broker.subscribe(f'user:{user_id}')
+    keepalive = app.config['SSE_KEEPALIVE']
+    db.session.remove()  # do not hold a DB connection for the lifetime of the stream
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                event = sub.get(timeout=keepalive)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event.get('type') == 'read':
+                    yield f"event: read\ndata: {json.dumps(event)}\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: message\ndata: {json.dumps(event)}\n\n"
+        finally:
+            sub.close()
+
+    response = Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    origin = request.headers.get('Origin')
+    if origin and urllib.parse.urlsplit(origin).hostname == request.host.rsplit(':', 1)[0].strip('[]'):
+        # Pages on the same host but the main server's port (SSE_STREAM_PORT), with the session cookie
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.vary.add('Origin')
+    return response
+
+@app.route('/messages/<username>/history', methods=['GET'])
+def messages_history(username):
+    """JSON page of older messages before `?before=<cursor>` for infinite scroll."""
+    if not session.get('user'):
+        abort(401)
+    me = current_user()
+    other = get_user_by_username(username)
+    if not other or not me or other.id == me.id:
+        abort(404)
+    before = decode_cursor(request.args.get('before'))
+    if before is None:
+        abort(400)
+    msgs, has_more = load_thread_page(me, other, before=before)
+    return jsonify(
+        messages=[
+            {
+                "id": m.id,
+                "sender_id": m.sender_id,
+                "content": m.content,
+                "time": m.created_at.strftime('%d.%m.%Y %H:%M'),
+            }
+            for m in msgs
+        ],
+        next_cursor=encode_cursor(msgs[0]) if has_more and msgs else None,
+    )
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and check_password_hash(user.password_hash, form.password.data):
+        try:
+            valid = bool(user) and password_hasher.verify(user.password_hash, form.password.data)
+            if valid and password_hasher.needs_rehash(user.password_hash):
+                # Transparent upgrade to the configured method/cost
+                user.password_hash = password_hasher.hash(form.password.data)
+                db.session.commit()
+        except HasherBusy:
+            flash('Server je přetížený, zkuste to prosím znovu', 'danger')
+            return render_template('auth/login.html', form=form), 503
+        if valid:
             session['user'] = user.username
+            session['user_id'] = user.id
             flash('Přihlášení úspěšné', 'success')
             return redirect(url_for('index'))
         flash('Neplatné přihlašovací údaje', 'danger')
@@ -478,38 +1603,275 @@ def login():
 def register():
     form = RegisterForm()
     if form.validate_on_submit():
+        # Until duplicates are resolved and the unique index exists, nothing else enforces it
+        if not email_unique_index_present() and email_taken(normalize_email(form.email.data)):
+            form.email.errors.append('Email je již použit')
+            return render_template('auth/register.html', form=form)
+        try:
+            password_hash = password_hasher.hash(form.password.data)
+        except HasherBusy:
+            flash('Server je přetížený, zkuste to prosím znovu', 'danger')
+            return render_template('auth/register.html', form=form), 503
         user = User(
             username=form.username.data,
-            email=form.email.data,
+            email=normalize_email(form.email.data),
             gender=form.gender.data,
-            password_hash=generate_password_hash(form.password.data)
+            password_hash=password_hash
         )
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as exc:
+            # Unique indexes decide; translate the violation back into form errors
+            db.session.rollback()
+            detail = str(exc.orig)
+            if 'user.username' in detail:
+                form.username.errors.append('Uživatelské jméno je již použito')
+            elif 'ux_user_email_normalized' in detail:
+                form.email.errors.append('Email je již použit')
+            else:
+                raise
+            return render_template('auth/register.html', form=form)
         flash('Registrace úspěšná, přihlaste se', 'success')
         return redirect(url_for('login'))
     return render_template('auth/register.html', form=form)
 
-with app.app_context():
-    # Auto-migrace: doplnění chybějících sloupců u stávající tabulky
+# --- Versioned schema migrations -------------------------------------------
+# Every step is idempotent (IF NOT EXISTS / PRAGMA checks) so that databases
+# created by older auto-migrating versions can be brought into the ledger by
+# simply running all steps. Steps added later must create their own tables
+# (Model.__table__.create(checkfirst=True)), because step 1 only runs once.
+
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(128), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    duration_ms = db.Column(db.Float, nullable=False, default=0)
+
+def table_columns(table):
+    return {row[1] for row in db.session.execute(text(f"PRAGMA table_info({table})"))}  # row[1] = column name
+
+def migration_initial_schema():
     db.create_all()
+
+def migration_form_data_columns():
+    cols = table_columns('form_data')
+    if 'gender' not in cols:
+        db.session.execute(text("ALTER TABLE form_data ADD COLUMN gender VARCHAR(10) NOT NULL DEFAULT 'muž'"))
+    if 'message' not in cols:
+        db.session.execute(text("ALTER TABLE form_data ADD COLUMN message TEXT NOT NULL DEFAULT ''"))
+
+def migration_user_columns():
+    cols = table_columns('user')
+    if 'email' not in cols:
+        db.session.execute(text("ALTER TABLE user ADD COLUMN email VARCHAR(128) NOT NULL DEFAULT ''"))
+    if 'gender' not in cols:
+        db.session.execute(text("ALTER TABLE user ADD COLUMN gender VARCHAR(10) NOT NULL DEFAULT 'muž'"))
+
+def migration_conversation_backfill():
+    # Populate the materialized inbox on databases that predate it
+    migration_conversation_read_state()  # rebuild_conversations() writes those columns
+    if db.session.execute(text("SELECT 1 FROM conversation LIMIT 1")).first() is None \
+            and db.session.execute(text("SELECT 1 FROM message LIMIT 1")).first() is not None:
+        rebuild_conversations()
+
+def migration_message_pair_index():
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_message_pair_time ON message (sender_id, receiver_id, created_at, id)"))
+
+def migration_user_search_indexes():
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_user_username_nocase ON user (username COLLATE NOCASE)"))
+    db.session.commit()
     try:
-        res = db.session.execute(text("PRAGMA table_info(form_data)"))
-        cols = {row[1] for row in res}  # row[1] = column name
-        if 'gender' not in cols:
-            db.session.execute(text("ALTER TABLE form_data ADD COLUMN gender VARCHAR(10) NOT NULL DEFAULT 'muž'"))
-        if 'message' not in cols:
-            db.session.execute(text("ALTER TABLE form_data ADD COLUMN message TEXT NOT NULL DEFAULT ''"))
-        # Ensure User table has required columns if created previously without them
-        res_user = db.session.execute(text("PRAGMA table_info(user)"))
-        user_cols = {row[1] for row in res_user}
-        if 'email' not in user_cols:
-            db.session.execute(text("ALTER TABLE user ADD COLUMN email VARCHAR(128) NOT NULL DEFAULT ''"))
-        if 'gender' not in user_cols:
-            db.session.execute(text("ALTER TABLE user ADD COLUMN gender VARCHAR(10) NOT NULL DEFAULT 'muž'"))
-        db.session.commit()
-    except Exception:
+        ensure_user_search_index()
+    except Exception as exc:
+        # SQLite bez FTS5/trigram: hledání zůstane u přesné a prefixové shody
         db.session.rollback()
+        app.logger.warning('user_search (FTS5 trigram) not created: %s', exc)
+
+def migration_form_data_indexes():
+    if 'created_at' not in table_columns('form_data'):
+        db.session.execute(text("ALTER TABLE form_data ADD COLUMN created_at DATETIME"))
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_form_data_email ON form_data (email, id)"))
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_form_data_created_at ON form_data (created_at)"))
+
+def migration_user_uniqueness():
+    # Duplicates are reported and leave the index out without holding back later steps;
+    # `flask migrate` retries it and register() checks e-mails by query until it exists
+    ensure_user_unique_indexes()
+
+def migration_fulltext_search():
+    try:
+        ensure_fulltext_index()
+    except Exception as exc:
+        # SQLite bez FTS5: fulltext zůstane vypnutý (FULLTEXT_SEARCH se nastaví při startu)
+        db.session.rollback()
+        app.logger.warning('message_search/form_search (FTS5) not created: %s', exc)
+
+def migration_conversation_read_state():
+    cols = table_columns('conversation')
+    if 'last_read_message_id' not in cols:
+        db.session.execute(text("ALTER TABLE conversation ADD COLUMN last_read_message_id INTEGER NOT NULL DEFAULT 0"))
+        # Existing history counts as read
+        db.session.execute(text("UPDATE conversation SET last_read_message_id = last_message_id"))
+    if 'unread_count' not in cols:
+        db.session.execute(text("ALTER TABLE conversation ADD COLUMN unread_count INTEGER NOT NULL DEFAULT 0"))
+    if 'unread_total' not in table_columns('user'):
+        db.session.execute(text("ALTER TABLE user ADD COLUMN unread_total INTEGER NOT NULL DEFAULT 0"))
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_conversation_unread ON conversation (user_id) WHERE unread_count > 0"))
+
+def migration_incremental_vacuum():
+    # auto_vacuum can only be switched by rewriting the file with a full VACUUM (one-time,
+    # outside a transaction); afterwards the retention job frees pages incrementally
+    if db.session.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+        return
+    db.session.commit()
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        conn.execute(text("VACUUM"))
+
+def migration_admin_job_heartbeat():
+    if 'updated_at' not in table_columns('admin_job'):
+        db.session.execute(text("ALTER TABLE admin_job ADD COLUMN updated_at DATETIME"))
+
+def rebuild_with_autoincrement(model, floor=0):
+    """Recreate `model`'s table with AUTOINCREMENT (rows, indexes, triggers and views kept)
+    and make sure its next id is above `floor`."""
+    table = model.__tablename__
+    sql = db.session.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :t"), {'t': table}).scalar()
+    script = []
+    if 'AUTOINCREMENT' not in sql.upper():
+        # Indexes and triggers go with the old table; views over it would break the rename
+        dependants = db.session.execute(text(
+            "SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL "
+            "AND ((type IN ('index', 'trigger') AND tbl_name = :t) OR (type = 'view' AND sql LIKE '%' || :t || '%')) "
+            "ORDER BY type = 'trigger', type = 'view'"
+        ), {'t': table}).fetchall()
+        columns = ', '.join(f'"{column.name}"' for column in model.__table__.columns)
+        create = str(CreateTable(model.__table__).compile(db.engine)).replace(f'TABLE {table} (', f'TABLE {table}_rebuild (', 1)
+        script += [f'DROP VIEW "{name}"' for kind, name, _ in dependants if kind == 'view']
+        script += [
+            create,
+            f'INSERT INTO {table}_rebuild ({columns}) SELECT {columns} FROM {table}',
+            f'DROP TABLE {table}',
+            f'ALTER TABLE {table}_rebuild RENAME TO {table}',
+        ]
+        script += [statement for _, _, statement in dependants]
+    floor = int(floor)
+    script += [
+        f"UPDATE sqlite_sequence SET seq = MAX(seq, {floor}) WHERE name = '{table}'",
+        f"INSERT INTO sqlite_sequence (name, seq) SELECT '{table}', {floor} "
+        f"WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = '{table}')",
+    ]
+    db.session.commit()
+    # One transaction for the whole swap; executescript() runs the DDL as written
+    db.session.connection().connection.executescript('BEGIN;\n' + ';\n'.join(script) + ';\nCOMMIT;')
+
+def migration_autoincrement_ids():
+    # Without AUTOINCREMENT SQLite hands out max(id) + 1, so once the newest row is deleted
+    # new rows reuse ids that archived rows (cursors, read receipts, exports) still refer to
+    archived = archive.max_ids()
+    for model in (Message, FormData):
+        rebuild_with_autoincrement(model, archived.get(model.__tablename__, 0))
+
+MIGRATIONS = [
+    (1, 'initial_schema', migration_initial_schema),
+    (2, 'form_data_gender_message_columns', migration_form_data_columns),
+    (3, 'user_email_gender_columns', migration_user_columns),
+    (4, 'conversation_backfill', migration_conversation_backfill),
+    (5, 'message_pair_time_index', migration_message_pair_index),
+    (6, 'user_search_indexes', migration_user_search_indexes),
+    (7, 'form_data_created_at_and_indexes', migration_form_data_indexes),
+    (8, 'user_email_unique_index', migration_user_uniqueness),
+    (9, 'conversation_read_state', migration_conversation_read_state),
+    (10, 'fulltext_search', migration_fulltext_search),
+    (11, 'incremental_auto_vacuum', migration_incremental_vacuum),
+    (12, 'admin_job_heartbeat', migration_admin_job_heartbeat),
+    (13, 'autoincrement_ids', migration_autoincrement_ids),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def current_schema_version():
+    try:
+        return db.session.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except OperationalError:
+        db.session.rollback()
+        return 0
+
+@contextmanager
+def migration_lock():
+    """Serialize migration runs across processes (flock next to the DB file; POSIX only)."""
+    path = db.engine.url.database
+    if fcntl is None or not path or path == ':memory:':
+        yield
+        return
+    with open(path + '.migrate.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def apply_migrations():
+    """Apply pending steps in order, recording each in schema_version. Returns applied versions."""
+    applied = []
+    with migration_lock():
+        SchemaVersion.__table__.create(db.engine, checkfirst=True)
+        version = current_schema_version()  # re-read under the lock
+        for number, name, step in MIGRATIONS:
+            if number <= version:
+                continue
+            started = time.perf_counter()
+            try:
+                step()
+                db.session.add(SchemaVersion(version=number, name=name, duration_ms=(time.perf_counter() - started) * 1000))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Migration %d (%s) failed', number, name)
+                raise
+            app.logger.info('Applied migration %d (%s)', number, name)
+            applied.append(number)
+    return applied
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations (run once per deploy)."""
+    applied = apply_migrations()
+    print(f'Schema version {current_schema_version()} (applied: {applied or "none"})')
+    if not email_unique_index_present() and ensure_user_unique_indexes():
+        # Step 8 found duplicates; the index is retried on every deploy until they are resolved
+        print('ux_user_email_normalized: blocked by duplicates, see `flask migrate-user-uniqueness`')
+
+with app.app_context():
+    # Startup only compares the schema version; migrations run via `flask migrate`
+    # (or here, once, when AUTO_MIGRATE=1 - the default for local runs)
+    boot_started = time.perf_counter()
+    version = current_schema_version()
+    if version < SCHEMA_VERSION and app.config['AUTO_MIGRATE']:
+        apply_migrations()
+        version = current_schema_version()
+    if version < SCHEMA_VERSION:
+        # Left to `flask migrate`; wsgi.py refuses to serve until it has run
+        app.logger.warning('Database schema is at version %d, app requires %d: run `flask migrate`', version, SCHEMA_VERSION)
+    if app.config['USER_SEARCH_TRIGRAM']:
+        app.config['USER_SEARCH_TRIGRAM'] = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'user_search'")).first() is not None
+    if app.config['FULLTEXT_SEARCH']:
+        app.config['FULLTEXT_SEARCH'] = db.session.execute(
+            text("SELECT COUNT(*) FROM sqlite_master WHERE name IN ('message_search', 'form_search')")).scalar() == 2
+    db.session.commit()
+    app.config['SCHEMA_VERSION'] = version
+    app.logger.info('Schema version %d checked in %.1f ms', version, (time.perf_counter() - boot_started) * 1000)
+    if sqlite_profile_enabled():
+        active = {name: db.session.execute(text(f"PRAGMA {name}")).scalar() for name in app.config['SQLITE_PRAGMAS']}
+        db.session.commit()
+        app.logger.info(
+            'SQLite profile %s: %s; pool_size=%d max_overflow=%d',
+            app.config['DB_PROFILE'], ', '.join(f'{k}={v}' for k, v in active.items()),
+            app.config['DB_POOL_SIZE'], app.config['DB_MAX_OVERFLOW'],
+        )
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Jen pro vývoj; produkčně `gunicorn -c gunicorn.conf.py wsgi:app`
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1')
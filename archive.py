@@ -0,0 +1,212 @@
+"""Cold storage for rows moved out of the hot database by the retention job.
+
+Archived rows live in a separate SQLite file as zlib-compressed NDJSON
+chunks: chat messages are grouped per conversation pair (so reading older
+history of one thread touches only that pair's chunks via an index), form
+submissions per batch. The file is written only by the retention job and
+read on demand, so the hot database keeps its tables, indexes and page
+cache small.
+
+Moving rows is at-least-once: a chunk is committed here before its rows are
+deleted from the hot database, so a crash in between can leave a copy in
+both. Readers only look at the archive below the oldest hot row and drop
+duplicate ids, so such copies are never shown twice.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+ArchivedMessage = namedtuple('ArchivedMessage', 'id sender_id receiver_id content created_at')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_chunk (
+    id INTEGER PRIMARY KEY,
+    user_lo INTEGER NOT NULL,
+    user_hi INTEGER NOT NULL,
+    first_at TEXT NOT NULL,
+    first_id INTEGER NOT NULL,
+    last_at TEXT NOT NULL,
+    last_id INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_message_chunk_pair ON message_chunk (user_lo, user_hi, last_at, last_id);
+CREATE TABLE IF NOT EXISTS form_chunk (
+    id INTEGER PRIMARY KEY,
+    first_id INTEGER NOT NULL,
+    last_id INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+"""
+
+
+def timestamp(value):
+    """Fixed-width ISO timestamp, so archived keys compare correctly as text."""
+    return value.isoformat(sep=' ', timespec='microseconds') if value else None
+
+
+def pack(rows, level):
+    return zlib.compress('\n'.join(json.dumps(row, ensure_ascii=False) for row in rows).encode('utf-8'), level)
+
+
+def unpack(payload):
+    return [json.loads(line) for line in zlib.decompress(payload).decode('utf-8').splitlines()]
+
+
+class Archive:
+    # While the file does not exist, look for it again at most this often (seconds)
+    presence_ttl = 30
+
+    def __init__(self, path, level=6):
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()  # guards the writer and the idle reader list only
+        self._writer = None
+        self._readers = []
+        self._pid = None
+        self._present = False
+        self._checked_at = None
+
+    def _reset_after_fork(self):
+        if self._pid != os.getpid():
+            self._writer, self._readers, self._pid = None, [], os.getpid()
+
+    def _writer_connection(self):
+        # Only the retention job writes; callers hold the lock
+        self._reset_after_fork()
+        if self._writer is None:
+            self._writer = sqlite3.connect(self.path, check_same_thread=False)
+            self._writer.executescript(SCHEMA)
+            self._present = True
+        return self._writer
+
+    def _available(self):
+        """Whether the archive file exists; a miss is cached for `presence_ttl` seconds."""
+        if not self._present:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.presence_ttl:
+                self._checked_at = now
+                self._present = os.path.exists(self.path)
+        return self._present
+
+    @contextmanager
+    def _reader(self):
+        """A pooled read connection (None without an archive), so concurrent readers do not queue."""
+        if not self._available():
+            yield None
+            return
+        with self._lock:
+            self._reset_after_fork()
+            conn = self._readers.pop() if self._readers else None
+            pid = self._pid
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                if pid == self._pid:
+                    self._readers.append(conn)
+
+    def add_messages(self, rows):
+        """Store message dicts (id, sender_id, receiver_id, content, created_at) as one chunk per pair."""
+        pairs = defaultdict(list)
+        for row in rows:
+            row = dict(row, created_at=timestamp(row['created_at']))
+            pairs[tuple(sorted((row['sender_id'], row['receiver_id'])))].append(row)
+        with self._lock:
+            conn = self._writer_connection()
+            with conn:
+                for (user_lo, user_hi), chunk in pairs.items():
+                    chunk.sort(key=lambda r: (r['created_at'], r['id']))
+                    conn.execute(
+                        "INSERT INTO message_chunk (user_lo, user_hi, first_at, first_id, last_at, last_id, rows, payload) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (user_lo, user_hi, chunk[0]['created_at'], chunk[0]['id'], chunk[-1]['created_at'],
+                         chunk[-1]['id'], len(chunk), pack(chunk, self.level)),
+                    )
+        return len(pairs)
+
+    def add_forms(self, rows):
+        """Store form submission dicts as one chunk."""
+        rows = [dict(row, created_at=timestamp(row.get('created_at'))) for row in rows]
+        with self._lock:
+            conn = self._writer_connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO form_chunk (first_id, last_id, rows, payload) VALUES (?, ?, ?, ?)",
+                    (rows[0]['id'], rows[-1]['id'], len(rows), pack(rows, self.level)),
+                )
+
+    def thread_page(self, user_a, user_b, before=None, limit=50):
+        """Up to `limit` archived messages of a pair older than `before` (created_at, id), newest first."""
+        user_lo, user_hi = sorted((user_a, user_b))
+        key = (timestamp(before[0]), before[1]) if before else None
+        found, seen = [], set()
+        sql = "SELECT payload FROM message_chunk WHERE user_lo = ? AND user_hi = ?"
+        params = [user_lo, user_hi]
+        if key:
+            sql += " AND (first_at, first_id) < (?, ?)"
+            params += list(key)
+        with self._reader() as conn:
+            if conn is None:
+                return []
+            try:
+                cursor = conn.execute(sql + " ORDER BY last_at DESC, last_id DESC", params)
+            except sqlite3.OperationalError:  # file created, schema not yet committed
+                return []
+            # Pairs without archived history end here, after one index seek. Chunks of a pair
+            # are written oldest first and do not overlap, so newest-first chunks can stop as
+            # soon as the page is full
+            for (payload,) in cursor:
+                for row in reversed(unpack(payload)):
+                    if row['id'] in seen or (key and (row['created_at'], row['id']) >= key):
+                        continue
+                    seen.add(row['id'])
+                    found.append(row)
+                if len(found) >= limit:
+                    break
+            cursor.close()
+        found.sort(key=lambda r: (r['created_at'], r['id']), reverse=True)
+        return [
+            ArchivedMessage(r['id'], r['sender_id'], r['receiver_id'], r['content'], datetime.fromisoformat(r['created_at']))
+            for r in found[:limit]
+        ]
+
+    def iter_forms(self):
+        """All archived form submissions, oldest chunk first."""
+        with self._reader() as conn:
+            chunks = conn.execute("SELECT payload FROM form_chunk ORDER BY first_id").fetchall() if conn else []
+        for (payload,) in chunks:
+            yield from unpack(payload)
+
+    def max_ids(self):
+        """Highest archived id per source table ('message', 'form_data'); 0 without rows."""
+        found = {'message': 0, 'form_data': 0}
+        with self._reader() as conn:
+            if conn is None:
+                return found
+            try:
+                found['form_data'] = conn.execute("SELECT COALESCE(MAX(last_id), 0) FROM form_chunk").fetchone()[0]
+                # Message chunks are ordered by time, so last_id need not be the highest id
+                for (payload,) in conn.execute("SELECT payload FROM message_chunk"):
+                    found['message'] = max(found['message'], max(row['id'] for row in unpack(payload)))
+            except sqlite3.OperationalError:  # file created, schema not yet committed
+                pass
+        return found
+
+    def stats(self):
+        with self._reader() as conn:
+            if conn is None:
+                return {}
+            return {
+                table: conn.execute(f"SELECT COUNT(*), COALESCE(SUM(rows), 0), COALESCE(SUM(length(payload)), 0) FROM {table}").fetchone()
+                for table in ('message_chunk', 'form_chunk')
+            }
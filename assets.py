@@ -0,0 +1,191 @@
+"""Static asset pipeline: vendored, fingerprinted and precompressed files.
+
+    python assets.py            # vendor (if missing) + build
+    python assets.py vendor     # (re)download the pinned third-party files
+    python assets.py build      # minify, fingerprint and compress into static/dist
+
+`vendor` stores Bootstrap and Bootstrap Icons under static/vendor. `build`
+copies every file under static/ (except dist/) into static/dist with a content
+hash in its name, minifies CSS that is not already minified, rewrites url()
+references between fingerprinted files, writes .gz (and .br when the `brotli`
+package is installed) variants for text assets and records the mapping in
+static/dist/manifest.json.
+
+At runtime `AssetManifest.url()` resolves `url_for('static', ...)`-style calls
+to the hashed URLs, which the app serves with far-future immutable caching.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import urllib.request
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are produced
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+
+BOOTSTRAP = 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist'
+BOOTSTRAP_ICONS = 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font'
+# static path -> pinned upstream URL (also the fallback while nothing is built)
+VENDOR = {
+    'vendor/bootstrap/css/bootstrap.min.css': BOOTSTRAP + '/css/bootstrap.min.css',
+    'vendor/bootstrap/js/bootstrap.bundle.min.js': BOOTSTRAP + '/js/bootstrap.bundle.min.js',
+    'vendor/bootstrap-icons/bootstrap-icons.min.css': BOOTSTRAP_ICONS + '/bootstrap-icons.min.css',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2': BOOTSTRAP_ICONS + '/fonts/bootstrap-icons.woff2',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff': BOOTSTRAP_ICONS + '/fonts/bootstrap-icons.woff',
+}
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.map')
+_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_SOURCE_MAP = re.compile(rb'/\*# sourceMappingURL=[^*]*\*/|//# sourceMappingURL=\S*')
+
+
+def vendor(static_dir=STATIC_DIR, refresh=False):
+    """Download the pinned third-party files into static/vendor."""
+    for name, url in VENDOR.items():
+        target = os.path.join(static_dir, name)
+        if os.path.exists(target) and not refresh:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        with open(target + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(target + '.tmp', target)
+        print(f'vendored {name} ({len(data)} B)')
+
+
+def minify_css(css):
+    """Conservative minifier: drops comments and collapses whitespace."""
+    css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def fingerprint(name, data):
+    root, ext = os.path.splitext(name)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _sources(static_dir):
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.relpath(os.path.join(root, d), static_dir) != DIST)
+        for filename in sorted(files):
+            if not filename.endswith('.tmp'):
+                yield os.path.relpath(os.path.join(root, filename), static_dir).replace(os.sep, '/')
+
+
+def _rewrite_urls(css, name, manifest):
+    base = os.path.dirname(name)
+
+    def replace(match):
+        ref = match.group(2).strip()
+        if ref.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path = os.path.normpath(os.path.join(base, re.split(r'[?#]', ref, maxsplit=1)[0])).replace(os.sep, '/')
+        if path not in manifest:
+            return match.group(0)
+        return f'url("{os.path.relpath(manifest[path], base or ".").replace(os.sep, "/")}")'
+
+    return _URL.sub(replace, css)
+
+
+def _write(dist_dir, name, data):
+    path = os.path.join(dist_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if name.endswith(COMPRESSIBLE):
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+
+def build(static_dir=STATIC_DIR):
+    """Rebuild static/dist and its manifest; returns {source name: hashed name}."""
+    dist_dir = os.path.join(static_dir, DIST)
+    shutil.rmtree(dist_dir, ignore_errors=True)
+    manifest = {}
+    # Non-CSS first, so stylesheets can point at the hashed fonts and images
+    names = sorted(_sources(static_dir), key=lambda n: (n.endswith('.css'), n))
+    for name in names:
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            data = f.read()
+        if name.endswith(('.css', '.js')):
+            data = _SOURCE_MAP.sub(b'', data)  # source maps are not shipped
+        if name.endswith('.css'):
+            css = data.decode('utf-8')
+            if not name.endswith('.min.css'):
+                css = minify_css(css)
+            data = _rewrite_urls(css, name, manifest).encode('utf-8')
+        manifest[name] = fingerprint(name, data)
+        _write(dist_dir, manifest[name], data)
+    with open(os.path.join(dist_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+class AssetManifest:
+    """Maps static file names to their fingerprinted URLs (see `build`)."""
+
+    def __init__(self, static_dir=STATIC_DIR):
+        self.dist_dir = os.path.join(static_dir, DIST)
+        try:
+            with open(os.path.join(self.dist_dir, MANIFEST)) as f:
+                self.files = json.load(f)
+        except (OSError, ValueError):
+            self.files = {}
+        self.hashed = set(self.files.values())
+
+    def url(self, url_for, endpoint, **values):
+        """Drop-in for `url_for`: static files resolve to their hashed /assets/ URL."""
+        if endpoint == 'static':
+            name = values.get('filename', '')
+            if name in self.files:
+                return url_for('asset', filename=self.files[name], **{k: v for k, v in values.items() if k != 'filename'})
+            if name in VENDOR:
+                return VENDOR[name]  # not built yet (local dev): fall back to the CDN
+        return url_for(endpoint, **values)
+
+    def encoded(self, filename, accept_encodings):
+        """Best precompressed variant of a hashed file: (path, content encoding or None)."""
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accept_encodings[encoding] and os.path.exists(os.path.join(self.dist_dir, filename + suffix)):
+                return filename + suffix, encoding
+        return filename, None
+
+    @staticmethod
+    def mimetype(filename):
+        return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', nargs='?', choices=['all', 'vendor', 'build'], default='all')
+    parser.add_argument('--refresh', action='store_true', help='re-download vendored files')
+    parser.add_argument('--static', default=STATIC_DIR, help='static directory (default: %(default)s)')
+    args = parser.parse_args(argv)
+    if args.command in ('all', 'vendor'):
+        vendor(args.static, refresh=args.refresh)
+    if args.command in ('all', 'build'):
+        manifest = build(args.static)
+        print(f'built {len(manifest)} assets into {os.path.join(args.static, DIST)}'
+              + ('' if brotli is not None else ' (brotli not installed: gzip only)'))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
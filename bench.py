@@ -0,0 +1,366 @@
+"""Benchmark harness for the main routes on a seeded SQLite database.
+
+Seeds a throw-away database at a configurable scale, drives `/` (GET and a
+contact-form POST), `/messages`, `/messages/<username>` and `/admin` either in-process through the Flask test
+client or over HTTP against a real multi-worker server, and writes a JSON
+report (p50/p95/p99 latency, throughput, queries per request per endpoint).
+
+    python bench.py --users 500 --contacts 10 --messages-per-pair 100 --formdata 50000
+    python bench.py --mode server --workers 4 --concurrency 16 --output run.json
+    python bench.py --mode server --server gunicorn --workers 4 --threads 8 --concurrency 16
+    python bench.py --db /tmp/bench.db --reuse --compare run.json
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+PASSWORD = 'bench'
+ENDPOINTS = ('index', 'index_post', 'messages', 'messages_thread', 'admin')
+
+
+def load_app(db_path):
+    """Import app.py against the benchmark database (must run before any other import of app)."""
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.abspath(db_path)}'
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    return app_module
+
+
+def seed(app_module, users, contacts, messages_per_pair, formdata, batch=5000):
+    """Fill the database; every user talks to `contacts` neighbours."""
+    from werkzeug.security import generate_password_hash
+    A = app_module
+    password_hash = generate_password_hash(PASSWORD)
+    start = datetime.utcnow() - timedelta(days=365)
+    with A.app.app_context():
+        def insert(table, rows):
+            for i in range(0, len(rows), batch):
+                A.db.session.execute(table.insert(), rows[i:i + batch])
+            A.db.session.commit()
+
+        insert(A.User.__table__, [
+            dict(id=i + 1, username=f'user{i}', email=f'user{i}@bench.local', gender='muž', password_hash=password_hash)
+            for i in range(users)
+        ])
+        rows, tick, pairs = [], 0, set()
+        for u in range(1, users + 1):
+            for k in range(1, contacts + 1):
+                peer = (u - 1 + k) % users + 1
+                if peer == u or frozenset((u, peer)) in pairs:
+                    continue
+                pairs.add(frozenset((u, peer)))
+                for m in range(messages_per_pair):
+                    sender, receiver = (u, peer) if m % 2 == 0 else (peer, u)
+                    tick += 1
+                    rows.append(dict(sender_id=sender, receiver_id=receiver, content=f'bench message {tick}',
+                                     created_at=start + timedelta(seconds=tick)))
+                if len(rows) >= batch:
+                    insert(A.Message.__table__, rows)
+                    rows = []
+        insert(A.Message.__table__, rows)
+        insert(A.FormData.__table__, [
+            dict(name=f'name{i}', email=f'sender{i % 1000}@bench.local', gender='žena' if i % 2 else 'muž',
+                 message=f'form message {i}', created_at=start + timedelta(seconds=i))
+            for i in range(formdata)
+        ])
+        A.rebuild_conversations()
+        if A.app.config['USER_SEARCH_TRIGRAM']:
+            A.db.session.execute(A.text("INSERT INTO user_search (user_search) VALUES ('rebuild')"))
+            A.db.session.commit()
+    return tick
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile."""
+    k = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(s['ms'] for s in samples)
+    queries = [s['queries'] for s in samples if s.get('queries') is not None]
+    errors = sum(1 for s in samples if s['status'] >= 400)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+class InProcessClient:
+    """Flask test client session; counts SQL statements executed by its own thread."""
+    _counter = threading.local()
+    _listening = False
+
+    def __init__(self, app_module):
+        self.A = app_module
+        self.client = app_module.app.test_client()
+        if not InProcessClient._listening:
+            from sqlalchemy import event
+            with app_module.app.app_context():
+                event.listen(app_module.db.engine, 'before_cursor_execute', self._count)
+            InProcessClient._listening = True
+
+    @classmethod
+    def _count(cls, *args):
+        cls._counter.n = getattr(cls._counter, 'n', 0) + 1
+
+    def login(self, username):
+        self.client.post('/login', data={'username': username, 'password': PASSWORD})
+
+    def login_admin(self):
+        self.client.post('/login_admin', data={'username': 'admin', 'password': 'admin'})
+
+    def get(self, path):
+        return self._measure(self.client.get, path)
+
+    def post(self, path, data):
+        return self._measure(self.client.post, path, data=data)
+
+    def _measure(self, send, path, **kwargs):
+        InProcessClient._counter.n = 0
+        t0 = time.perf_counter()
+        resp = send(path, **kwargs)
+        ms = (time.perf_counter() - t0) * 1000
+        return {'ms': ms, 'status': resp.status_code, 'queries': InProcessClient._counter.n}
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPClient:
+    """Cookie-keeping urllib session against a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        cookies = urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        self.opener = urllib.request.build_opener(cookies)
+        # Measured POSTs stop at the redirect, so the follow-up GET is not counted
+        self.post_opener = urllib.request.build_opener(cookies, NoRedirect())
+
+    def _post(self, path, data):
+        body = urllib.parse.urlencode(data).encode()
+        self.opener.open(self.base_url + path, body, timeout=30).read()
+
+    def login(self, username):
+        self._post('/login', {'username': username, 'password': PASSWORD})
+
+    def login_admin(self):
+        self._post('/login_admin', {'username': 'admin', 'password': 'admin'})
+
+    def get(self, path):
+        return self._measure(self.opener, path)
+
+    def post(self, path, data):
+        return self._measure(self.post_opener, path, urllib.parse.urlencode(data).encode())
+
+    def _measure(self, opener, path, body=None):
+        t0 = time.perf_counter()
+        try:
+            resp = opener.open(self.base_url + path, body, timeout=30)
+            resp.read()
+            status, headers = resp.status, resp.headers
+        except urllib.error.HTTPError as exc:
+            status, headers = exc.code, exc.headers
+        ms = (time.perf_counter() - t0) * 1000
+        queries = headers.get('X-Query-Count') if headers else None
+        return {'ms': ms, 'status': status, 'queries': int(queries) if queries else None}
+
+
+def endpoint_path(endpoint, peer):
+    return {
+        'index': '/',
+        'index_post': '/',
+        'messages': '/messages',
+        'messages_thread': f'/messages/{peer}',
+        'admin': '/admin',
+    }[endpoint]
+
+
+def run_endpoint(make_client, endpoint, users, requests, concurrency):
+    """Issue `requests` requests to one endpoint from `concurrency` logged-in clients.
+
+    `index_post` submits the anonymous contact form (the FormData write path);
+    every other endpoint is a GET.
+    """
+    per_worker = max(1, requests // concurrency)
+    ready = threading.Barrier(concurrency)
+
+    def worker(worker_id):
+        rnd = random.Random(worker_id)
+        uid = rnd.randrange(users)
+        peer = (uid + 1) % users
+        client = make_client()
+        if endpoint == 'admin':
+            client.login_admin()
+        elif endpoint not in ('index', 'index_post'):
+            client.login(f'user{uid}')
+        path = endpoint_path(endpoint, f'user{peer}')
+        if endpoint == 'index_post':
+            submit = lambda i: client.post(path, {
+                'name': f'bench{worker_id}', 'email': f'bench{worker_id}@example.com',
+                'gender': 'muž', 'message': f'bench submission {worker_id}-{i}',
+            })
+        else:
+            submit = lambda i: client.get(path)
+        submit(-1)  # warm-up
+        ready.wait()  # logins (password hashing) stay out of the measured window
+        start = time.perf_counter()
+        samples = [submit(i) for i in range(per_worker)]
+        return start, time.perf_counter(), samples
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    elapsed = max(r[1] for r in results) - min(r[0] for r in results)
+    return summarize([s for r in results for s in r[2]], elapsed)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(db_path, workers, port, server='werkzeug', threads=1):
+    """Start a multi-worker server (forking werkzeug dev server or gunicorn) for the seeded database."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    if server == 'gunicorn':
+        env = dict(os.environ, SQLALCHEMY_DATABASE_URI=f'sqlite:///{os.path.abspath(db_path)}',
+                   WEB_WORKERS=str(workers), WEB_THREADS=str(threads), WEB_BIND=f'127.0.0.1:{port}',
+                   WEB_ACCESSLOG='')
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    else:
+        env = None
+        code = (
+            'import bench; '
+            f'A = bench.load_app({db_path!r}); '
+            # forked children must not share the parent's pooled SQLite connections
+            'ctx = A.app.app_context(); ctx.push(); A.db.engine.dispose(); ctx.pop(); '
+            'from werkzeug.serving import run_simple; '
+            f'run_simple("127.0.0.1", {port}, A.app, processes={workers}, threaded=False)'
+        )
+        cmd = [sys.executable, '-c', code]
+    proc = subprocess.Popen(cmd, cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError('Benchmark server did not start')
+
+
+def compare(report, baseline_path, tolerance):
+    """Print endpoints whose p95 or queries/request regressed beyond `tolerance` (fraction)."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for endpoint, cur in report['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(endpoint)
+        if not old:
+            continue
+        for metric in ('p95_ms', 'queries_per_request'):
+            if old.get(metric) and cur.get(metric) and cur[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f'{endpoint}.{metric}: {old[metric]} -> {cur[metric]}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='database file (default: temporary)')
+    parser.add_argument('--reuse', action='store_true', help='use an already seeded --db as is')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--contacts', type=int, default=5, help='conversation partners per user')
+    parser.add_argument('--messages-per-pair', type=int, default=50)
+    parser.add_argument('--formdata', type=int, default=10000)
+    parser.add_argument('--mode', choices=('client', 'server'), default='client')
+    parser.add_argument('--url', help='benchmark an already running server instead of spawning one')
+    parser.add_argument('--workers', type=int, default=4, help='server processes in --mode server')
+    parser.add_argument('--server', choices=('werkzeug', 'gunicorn'), default='werkzeug',
+                        help='server spawned in --mode server (werkzeug = forking dev server baseline)')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gunicorn worker (gthread)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--output', help='write the JSON report here (default: stdout)')
+    parser.add_argument('--compare', help='baseline report; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed regression fraction for --compare')
+    args = parser.parse_args(argv)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')
+    A = load_app(db_path)
+    seed_seconds = None
+    if not args.reuse:
+        t0 = time.perf_counter()
+        seed(A, args.users, args.contacts, args.messages_per_pair, args.formdata)
+        seed_seconds = round(time.perf_counter() - t0, 2)
+
+    proc = None
+    if args.mode == 'server':
+        base_url = args.url
+        if not base_url:
+            port = free_port()
+            proc = spawn_server(db_path, args.workers, port, server=args.server, threads=args.threads)
+            base_url = f'http://127.0.0.1:{port}'
+        make_client = lambda: HTTPClient(base_url)
+    else:
+        make_client = lambda: InProcessClient(A)
+
+    report = {
+        'created': datetime.utcnow().isoformat(timespec='seconds'),
+        'mode': args.mode,
+        'server': args.server if args.mode == 'server' and not args.url else None,
+        'workers': args.workers if args.mode == 'server' else 1,
+        'concurrency': args.concurrency,
+        'scale': {'users': args.users, 'contacts': args.contacts,
+                  'messages_per_pair': args.messages_per_pair, 'formdata': args.formdata},
+        'seed_seconds': seed_seconds,
+        'endpoints': {},
+    }
+    try:
+        for endpoint in args.endpoints.split(','):
+            report['endpoints'][endpoint] = run_endpoint(
+                make_client, endpoint, args.users, args.requests, args.concurrency)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out + '\n')
+    else:
+        print(out)
+    if args.compare:
+        regressions = compare(report, args.compare, args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
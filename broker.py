@@ -0,0 +1,175 @@
+"""Pub/sub brokers used to push chat events to open Server-Sent Event streams.
+
+`LocalBroker` fans events out to subscribers inside one process. `SQLiteBroker`
+is a stand-in for an external broker (Redis etc.) when the app runs in several
+worker processes: events are appended to a small SQLite log that every process
+tails and re-publishes to its own local subscribers.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+class Subscription:
+    """Bounded queue of events for one channel listener."""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._push_lock = threading.Lock()  # publishers only; the reader never blocks on it
+
+    def push(self, data):
+        # A stalled client must not block publishers: when full, drop the oldest event.
+        # Serialized, so a concurrent publisher cannot refill the freed slot in between
+        with self._push_lock:
+            while True:
+                try:
+                    self.queue.put_nowait(data)
+                    return
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout=None):
+        """Next event, or None when `timeout` elapses without one."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process broker: publish() hands events straight to subscribers."""
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channel):
+        sub = Subscription(self, channel, self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.channel)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.channel]
+
+    def publish(self, channel, data):
+        self._fanout(channel, data)
+
+    def _fanout(self, channel, data):
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        for sub in subs:
+            sub.push(data)
+
+
+class SQLiteBroker(LocalBroker):
+    """Cross-process broker backed by an append-only SQLite event log.
+
+    Each process runs one tailing thread (started lazily on first subscribe, so
+    it survives pre-fork servers) that polls for rows newer than the last one
+    seen and fans them out locally. The tailing threads also prune old rows every
+    `prune_interval` seconds, so a publish is a single INSERT on a per-thread
+    connection (processes that only publish leave pruning to the tailing ones).
+    """
+
+    def __init__(self, path, max_queue=100, poll_interval=0.25, retention=60, prune_interval=10):
+        super().__init__(max_queue=max_queue)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._tail_pid = None
+        self._tail_lock = threading.Lock()
+        self._local = threading.local()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")  # persistent in the file, set once
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS broker_event ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+                "data TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_broker_event_created ON broker_event (created)")
+        finally:
+            conn.close()
+
+    def _connect(self, timeout=5):
+        return sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+
+    def _publisher(self):
+        """This thread's publishing connection, reopened after a fork."""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn, local.pid = self._connect(), os.getpid()
+        return local.conn
+
+    def publish(self, channel, data):
+        self._publisher().execute(
+            "INSERT INTO broker_event (channel, data, created) VALUES (?, ?, ?)",
+            (channel, json.dumps(data), time.time()),
+        )
+
+    def subscribe(self, channel):
+        self._ensure_tail()
+        return super().subscribe(channel)
+
+    def _ensure_tail(self):
+        with self._tail_lock:
+            if self._tail_pid == os.getpid():
+                return
+            self._tail_pid = os.getpid()
+            threading.Thread(target=self._tail, name='sqlite-broker-tail', daemon=True).start()
+
+    def _prune(self, conn):
+        try:
+            conn.execute("DELETE FROM broker_event WHERE created < ?", (time.time() - self.retention,))
+        except sqlite3.OperationalError:
+            pass  # log busy: another process prunes, or this one retries next interval
+
+    def _tail(self):
+        # Reads never wait in WAL mode; with no busy wait the prune cannot stall the
+        # thread either (it runs as a greenlet on the gevent stream server)
+        conn = self._connect(timeout=0)
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM broker_event").fetchone()[0]
+        pruned = time.monotonic()
+        while True:
+            if time.monotonic() - pruned >= self.prune_interval:
+                self._prune(conn)
+                pruned = time.monotonic()
+            try:
+                rows = conn.execute(
+                    "SELECT id, channel, data FROM broker_event WHERE id > ? ORDER BY id",
+                    (last_id,),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                rows = []
+            for event_id, channel, data in rows:
+                last_id = event_id
+                self._fanout(channel, json.loads(data))
+            time.sleep(self.poll_interval)
+
+
+def create_broker(url):
+    """Broker for `memory://` or `sqlite:///<path>` URLs."""
+    if url.startswith('sqlite:///'):
+        return SQLiteBroker(url[len('sqlite:///'):])
+    if url in ('', 'memory://'):
+        return LocalBroker()
+    raise ValueError(f'Unsupported MESSAGE_BROKER_URL: {url}')
@@ -0,0 +1,44 @@
+"""Helpers for the SQLite FTS5 full-text search over messages and form data.
+
+User input never reaches FTS5 query syntax directly: `match_expression`
+turns it into quoted terms (all required, the last one as a prefix), and
+`highlight` converts snippet() output, whose match markers are control
+characters, into escaped HTML with <mark> tags.
+"""
+import re
+
+from markupsafe import Markup, escape
+
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+_TERM = re.compile(r'\w+')
+
+
+def match_expression(q, max_terms=8):
+    """FTS5 MATCH expression for free text, or None when `q` has no searchable words."""
+    terms = _TERM.findall(q or '')[:max_terms]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]  # \w never contains a quote, so no escaping needed
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def highlight(snippet):
+    """Escaped snippet with the FTS5 match markers turned into <mark> tags."""
+    html = str(escape(snippet or ''))
+    return Markup(html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+
+def encode_cursor(score, row_id):
+    """Keyset cursor after a ranked hit; repr() keeps the float exact."""
+    return f'{score!r}:{row_id}'
+
+
+def decode_cursor(value):
+    """Parse a `score:id` cursor; returns None for missing or malformed input."""
+    try:
+        score, row_id = value.rsplit(':', 1)
+        return float(score), int(row_id)
+    except (AttributeError, ValueError):
+        return None
@@ -0,0 +1,27 @@
+# Produkční konfigurace gunicornu (načítá se přes `gunicorn -c gunicorn.conf.py wsgi:app`)
+import multiprocessing
+import os
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+# Procesy × vlákna: gthread worker obslouží WEB_THREADS requestů současně,
+# otevřený SSE stream (/messages/stream) drží jedno vlákno po celou dobu spojení
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 8))
+worker_class = 'gthread'
+# app.py se importuje jednou v masteru (migrace, indexy, PRAGMA), workery se jen forknou
+preload_app = os.environ.get('WEB_PRELOAD', '1') == '1'
+# Keep-alive spojení za reverzní proxy / load balancerem
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+# Graceful restart: SIGHUP / max_requests nechá workery dokončit rozběhnuté requesty
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 500))
+accesslog = os.environ.get('WEB_ACCESSLOG', '-') or None  # prázdné = vypnuto
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from wsgi import reset_after_fork
+        reset_after_fork()
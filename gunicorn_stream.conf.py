@@ -0,0 +1,26 @@
+# Server jen pro SSE streamy (načítá se přes `gunicorn -c gunicorn_stream.conf.py stream:app`)
+import os
+
+# Patch before preload_app imports app.py, so the broker's locks, queues and tail
+# thread are cooperative in the forked workers as well
+from gevent import monkey
+monkey.patch_all()
+
+# gevent worker: každý otevřený stream je greenlet. Stream při otevření nečte databázi,
+# takže blokující volání sqlite3 (čekání na zámek zápisu) hub nezastaví; všechny ostatní
+# routy zůstávají na gthread serveru z gunicorn.conf.py.
+worker_class = 'gevent'
+bind = os.environ.get('WEB_STREAM_BIND', '0.0.0.0:5002')
+workers = int(os.environ.get('WEB_STREAM_WORKERS', 2))
+worker_connections = int(os.environ.get('WEB_STREAM_CONNECTIONS', 1000))  # souběžných streamů na proces
+preload_app = True
+# Streamy jsou dlouhá spojení s keep-alive komentáři každých SSE_KEEPALIVE sekund
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+accesslog = os.environ.get('WEB_ACCESSLOG', '-') or None  # prázdné = vypnuto
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    from wsgi import reset_after_fork
+    reset_after_fork()
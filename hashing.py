@@ -0,0 +1,67 @@
+"""Password hashing isolated in a bounded process pool.
+
+Hashing is deliberately slow CPU work; running it on request threads lets a
+burst of logins starve every other route sharing the worker. `PasswordHasher`
+runs it in at most `workers` separate processes and rejects new work as soon
+as `max_pending` hashes are already queued or running.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """The pool is saturated (or timed out); the caller should fail fast."""
+
+
+class PasswordHasher:
+    def __init__(self, method='pbkdf2:sha256:260000', workers=2, max_pending=16, timeout=5.0):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._prefix = None
+
+    def _executor(self):
+        # Created lazily per process (pre-fork servers); 'spawn' avoids forking a threaded worker
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when `pwhash` was made with a different method or cost than configured."""
+        if self._prefix is None:
+            # The method may omit defaults (`pbkdf2:sha256`); take the canonical prefix from a
+            # real hash, once per process
+            self._prefix = self._run(generate_password_hash, '', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefix
@@ -0,0 +1,118 @@
+"""Write-batching queue for high-volume inserts (contact-form submissions).
+
+Producers call `BatchWriter.submit()`; a single writer thread collects items
+until `batch_size` is reached or `flush_interval` elapses and hands the whole
+batch to `flush`, so many submissions share one transaction (and one fsync).
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the buffer stays full for `enqueue_timeout`."""
+
+
+class Ticket:
+    """Handle for one submitted item; wait() blocks until its batch is flushed."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.error = None
+
+    def resolve(self, error=None):
+        self.error = error
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """True once the item is durably written, False on failure or timeout."""
+        return self._event.wait(timeout) and self.error is None
+
+    @property
+    def pending(self):
+        """Still queued or being written (a wait() timeout, not a failure)."""
+        return not self._event.is_set()
+
+
+class BatchWriter:
+    def __init__(self, flush, batch_size=200, flush_interval=0.05, max_queue=10000, enqueue_timeout=0.5):
+        self.flush = flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def submit(self, item):
+        """Enqueue `item`; applies backpressure by raising QueueFull when saturated."""
+        self._ensure_thread()
+        ticket = Ticket()
+        try:
+            self.queue.put((item, ticket), timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise QueueFull()
+        return ticket
+
+    def _ensure_thread(self):
+        # Started lazily and per process, so it survives pre-fork servers
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='ingest-writer', daemon=True).start()
+            atexit.register(self.close)
+
+    def _collect(self):
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            self.flush([item for item, _ in batch])
+        except Exception as exc:
+            log.exception('Batch of %d items failed to flush', len(batch))
+            for _, ticket in batch:
+                ticket.resolve(exc)
+        else:
+            for _, ticket in batch:
+                ticket.resolve()
+
+    def _run(self):
+        while not self._stopping:
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def close(self):
+        """Flush whatever is still buffered (called at interpreter exit)."""
+        self._stopping = True
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
@@ -0,0 +1,139 @@
+"""Per-request SQL instrumentation built on SQLAlchemy engine events.
+
+For every request it counts statements and database time (exposed as
+`X-Query-Count`, `X-Query-Time-ms` and `Server-Timing` response headers),
+logs the shape of statements slower than a threshold (never the bound
+values) together with their EXPLAIN QUERY PLAN, and warns when one statement shape repeats within a request (N+1).
+Aggregates per endpoint are served in Prometheus text format at `/metrics`.
+
+Hot-path cost is two perf_counter() calls and a few dict updates per
+statement; EXPLAIN only runs for statements that were already slow.
+"""
+import logging
+import re
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+slow_log = logging.getLogger('sql.slow')
+repeat_log = logging.getLogger('sql.repeat')
+
+_IN_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_VALUES_ROWS = re.compile(r'(\([?,\s]+\))(?:\s*,\s*\([?,\s]+\))+')
+
+
+def statement_shape(statement):
+    """Collapse multi-row VALUES and expanded IN (?, ?, ...) lists so equivalent statements compare equal."""
+    return _IN_LIST.sub('(?)', _VALUES_ROWS.sub(r'\1, ...', statement))
+
+
+def parameter_summary(parameters, executemany):
+    """Count of bound values only: they carry message text, e-mails and password hashes."""
+    if executemany:
+        return f'{len(parameters)} rows'
+    return f'{len(parameters or ())} params'
+
+
+class SQLInstrumentation:
+    def __init__(self, app=None, engine=None):
+        self._lock = threading.Lock()
+        self.endpoints = {}  # endpoint -> [requests, queries, seconds]
+        self.slow_total = 0
+        self.repeat_total = 0
+        if app is not None and engine is not None:
+            self.init_app(app, engine)
+
+    def init_app(self, app, engine):
+        app.config.setdefault('SQL_SLOW_QUERY_MS', 100)
+        app.config.setdefault('SQL_REPEAT_THRESHOLD', 5)
+        self.slow_seconds = app.config['SQL_SLOW_QUERY_MS'] / 1000
+        self.repeat_threshold = app.config['SQL_REPEAT_THRESHOLD']
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def _start_request(self):
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        g.sql_shapes = {}
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        context._sqlmetrics_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._sqlmetrics_start
+        if elapsed >= self.slow_seconds:
+            self._log_slow(cursor, statement, parameters, elapsed, executemany)
+        if not has_request_context() or 'sql_count' not in g:
+            return
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+        shape = statement_shape(statement)
+        seen = g.sql_shapes.get(shape, 0) + 1
+        g.sql_shapes[shape] = seen
+        if seen == self.repeat_threshold:
+            with self._lock:
+                self.repeat_total += 1
+            repeat_log.warning('Statement repeated %d times in %s %s (possible N+1): %s',
+                               seen, request.method, request.path, shape)
+
+    def _log_slow(self, cursor, statement, parameters, elapsed, executemany):
+        with self._lock:
+            self.slow_total += 1
+        plan = ''
+        if not executemany and statement.lstrip().upper().startswith('SELECT'):
+            try:
+                # Fresh DBAPI cursor: bypasses engine events and leaves the result untouched
+                explain = cursor.connection.cursor()
+                rows = explain.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ()).fetchall()
+                explain.close()
+                plan = '\n'.join(f'  {row[-1]}' for row in rows)
+            except Exception as exc:
+                plan = f'  (EXPLAIN failed: {exc})'
+        where = f' in {request.method} {request.path}' if has_request_context() else ''
+        slow_log.warning('Slow query (%.1f ms)%s: %s [%s]\n%s',
+                         elapsed * 1000, where, statement_shape(statement), parameter_summary(parameters, executemany), plan)
+
+    def _finish_request(self, response):
+        if 'sql_count' not in g:
+            return response
+        ms = g.sql_seconds * 1000
+        response.headers['X-Query-Count'] = str(g.sql_count)
+        response.headers['X-Query-Time-ms'] = f'{ms:.2f}'
+        response.headers.add('Server-Timing', f'db;desc="{g.sql_count} queries";dur={ms:.2f}')
+        endpoint = request.endpoint or 'unknown'
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, [0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += g.sql_count
+            stats[2] += g.sql_seconds
+        return response
+
+    def metrics_view(self):
+        """Process-local counters in Prometheus text exposition format."""
+        with self._lock:
+            endpoints = {k: list(v) for k, v in self.endpoints.items()}
+            slow_total, repeat_total = self.slow_total, self.repeat_total
+        lines = []
+        for name, idx, kind, help_text in (
+            ('app_requests_total', 0, 'counter', 'HTTP requests handled'),
+            ('app_sql_queries_total', 1, 'counter', 'SQL statements executed'),
+            ('app_sql_seconds_total', 2, 'counter', 'Time spent in SQL statements'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for endpoint, stats in sorted(endpoints.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {stats[idx]}')
+        lines += [
+            '# HELP app_sql_slow_queries_total SQL statements above the slow-query threshold',
+            '# TYPE app_sql_slow_queries_total counter',
+            f'app_sql_slow_queries_total {slow_total}',
+            '# HELP app_sql_repeated_statements_total Statement shapes repeated within one request',
+            '# TYPE app_sql_repeated_statements_total counter',
+            f'app_sql_repeated_statements_total {repeat_total}',
+        ]
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
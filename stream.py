@@ -0,0 +1,20 @@
+"""WSGI entry point of the stream server.
+
+    gunicorn -c gunicorn_stream.conf.py stream:app
+
+Serves only /messages/stream from gevent workers, so thousands of open
+streams cost a greenlet each instead of a thread of the main gthread server.
+Everything else (every route that queries the database) gets a 404 here and
+stays on `wsgi:app`; pages find this server through SSE_STREAM_PORT.
+"""
+from werkzeug.exceptions import NotFound
+
+from wsgi import application
+
+STREAM_PATH = '/messages/stream'
+
+
+def app(environ, start_response):
+    if environ.get('PATH_INFO') != STREAM_PATH:
+        return NotFound()(environ, start_response)
+    return application(environ, start_response)
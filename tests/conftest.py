@@ -0,0 +1,68 @@
+"""Test setup: app.py configures itself at import, so point it at a temporary
+database (and archive) before the first import."""
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import _app_ctx_stack
+from flask.testing import FlaskClient
+
+_tmp = tempfile.mkdtemp(prefix='formapp-tests-')
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(_tmp, 'test.db')
+os.environ['ARCHIVE_PATH'] = os.path.join(_tmp, 'archive.db')
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+os.environ['SQL_INSTRUMENTATION'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+_names = itertools.count()
+
+
+class IsolatedClient(FlaskClient):
+    """Runs each request in its own app context: Flask would otherwise reuse the
+    test's context and share `g` (the cached current user) between clients."""
+
+    def open(self, *args, **kwargs):
+        ctx = _app_ctx_stack.top
+        if ctx is not None:
+            ctx.pop()
+        try:
+            return super().open(*args, **kwargs)
+        finally:
+            if ctx is not None:
+                ctx.push()
+
+
+app_module.app.test_client_class = IsolatedClient
+
+
+@pytest.fixture
+def A():
+    with app_module.app.app_context():
+        yield app_module
+        app_module.db.session.remove()
+
+
+@pytest.fixture
+def make_user(A):
+    def make_user():
+        name = f'user{next(_names)}'
+        user = A.User(username=name, email=f'{name}@example.com', gender='muž', password_hash=A.password_hasher.hash('pw'))
+        A.db.session.add(user)
+        A.db.session.commit()
+        return A.get_user(user.id)  # plain snapshot, unaffected by session teardown
+    return make_user
+
+
+@pytest.fixture
+def login(A):
+    def login(user):
+        client = A.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user'], sess['user_id'] = user.username, user.id
+        return client
+    return login
@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+import time
+
+from broker import LocalBroker, SQLiteBroker
+
+
+def test_concurrent_publishers_drop_oldest_without_raising():
+    broker = LocalBroker(max_queue=2)
+    sub = broker.subscribe('user:1')
+    errors = []
+
+    def publish():
+        try:
+            for i in range(5000):
+                broker.publish('user:1', i)
+        except Exception as exc:  # queue.Full used to escape from push()
+            errors.append(exc)
+
+    threads = [threading.Thread(target=publish) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sub.queue.qsize() == 2
+
+
+def test_sqlite_broker_delivers_across_instances_and_prunes(tmp_path):
+    path = str(tmp_path / 'broker.db')
+    publisher = SQLiteBroker(path)
+    listener = SQLiteBroker(path, poll_interval=0.01, retention=0.05, prune_interval=0.05)
+    sub = listener.subscribe('user:1')
+    time.sleep(0.05)  # tail thread started and positioned at the end of the log
+    publisher.publish('user:1', {'id': 1})
+    assert sub.get(timeout=2) == {'id': 1}
+    deadline = time.time() + 2
+    while time.time() < deadline and _event_count(path):
+        time.sleep(0.02)
+    assert _event_count(path) == 0
+
+
+def _event_count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM broker_event").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_broker_failure_after_commit_does_not_fail_the_send(A, make_user, login, monkeypatch):
+    a, b = make_user(), make_user()
+
+    def unavailable(channel, data):
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(A.broker, 'publish', unavailable)
+    response = login(a).post(f'/messages/{b.username}', data={'message': 'ahoj'})
+    assert response.status_code == 302
+    assert A.db.session.query(A.Message).filter_by(sender_id=a.id, receiver_id=b.id).count() == 1
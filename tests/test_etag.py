@@ -0,0 +1,12 @@
+def test_flash_after_redirect_is_not_swallowed_by_304(A, make_user, login):
+    me = make_user()
+    client = login(me)
+    etag = client.get('/messages').headers['ETag']
+    assert client.get('/messages', headers={'If-None-Match': etag}).status_code == 304
+
+    response = client.get('/messages/nobody-like-this', headers={'If-None-Match': etag}, follow_redirects=True)
+    assert response.status_code == 200
+    assert 'Uživatel nenalezen' in response.get_data(as_text=True)
+    assert 'ETag' not in response.headers  # the flash is in this body only
+
+    assert client.get('/messages', headers={'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+
+# Tables as the baseline release created them (before the versioned migrations)
+BASELINE_SCHEMA = """
+CREATE TABLE form_data (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(128) NOT NULL, email VARCHAR(128) NOT NULL,
+                        gender VARCHAR(10) NOT NULL, message TEXT NOT NULL);
+CREATE TABLE user (id INTEGER NOT NULL PRIMARY KEY, username VARCHAR(128) NOT NULL UNIQUE, email VARCHAR(128) NOT NULL,
+                   gender VARCHAR(10) NOT NULL, password_hash VARCHAR(256) NOT NULL);
+CREATE TABLE message (id INTEGER NOT NULL PRIMARY KEY, sender_id INTEGER NOT NULL REFERENCES user (id),
+                      receiver_id INTEGER NOT NULL REFERENCES user (id), content TEXT NOT NULL, created_at DATETIME NOT NULL);
+"""
+
+
+@pytest.fixture
+def baseline_db(A, tmp_path, monkeypatch):
+    """Point the app at a baseline-shaped database holding two case/space variants of one e-mail."""
+    path = tmp_path / 'baseline.db'
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO user (username, email, gender, password_hash) VALUES (?, ?, 'muž', 'x')",
+                     [('first', 'A@x.cz'), ('second', 'a@x.cz ')])
+    conn.execute("INSERT INTO message (sender_id, receiver_id, content, created_at) VALUES (1, 2, 'ahoj', '2024-01-01 10:00:00')")
+    conn.commit()
+    conn.close()
+    A.db.session.remove()
+    monkeypatch.setitem(A.app.config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{path}')
+    monkeypatch.setitem(A.app.config, 'WTF_CSRF_ENABLED', False)
+    monkeypatch.setattr(A, '_email_index_present', False)
+    yield path
+    A.db.session.remove()
+
+
+def test_duplicate_emails_do_not_hold_back_later_steps(A, baseline_db):
+    A.apply_migrations()
+    assert A.current_schema_version() == A.SCHEMA_VERSION
+    assert not A.email_unique_index_present()
+    # Later steps ran on the old data
+    assert A.db.session.query(A.Conversation).count() == 2
+    assert 'updated_at' in A.table_columns('admin_job')
+
+    response = A.app.test_client().post('/register', data={
+        'username': 'third', 'email': 'a@X.cz', 'gender': 'muž', 'password': 'pw'})
+    assert 'Email je již použit' in response.get_data(as_text=True)
+    assert A.db.session.query(A.User).filter_by(username='third').first() is None
+
+
+def test_migrate_creates_the_index_once_duplicates_are_resolved(A, baseline_db):
+    runner = A.app.test_cli_runner()
+    result = runner.invoke(args=['migrate'])
+    assert result.exit_code == 0
+    assert 'blocked by duplicates' in result.output
+
+    A.db.session.query(A.User).filter_by(username='second').delete()
+    A.db.session.commit()
+    result = runner.invoke(args=['migrate'])
+    assert result.exit_code == 0
+    assert 'blocked' not in result.output
+    assert A.email_unique_index_present()
+
+
+def test_hot_tables_continue_above_archived_ids(A, baseline_db, tmp_path, monkeypatch):
+    archived = A.Archive(str(tmp_path / 'archive.db'))
+    archived.add_messages([dict(id=50, sender_id=1, receiver_id=2, content='old', created_at=A.datetime(2020, 1, 1))])
+    monkeypatch.setattr(A, 'archive', archived)
+    A.apply_migrations()
+
+    schema = dict(A.db.session.execute(A.text("SELECT name, sql FROM sqlite_master WHERE name IN ('message', 'form_data')")).fetchall())
+    assert all('AUTOINCREMENT' in sql for sql in schema.values())
+    indexes = {name for (name,) in A.db.session.execute(A.text("SELECT name FROM sqlite_master WHERE tbl_name = 'message'"))}
+    assert {'ix_message_pair_time', 'message_search_ai', 'message_search_ad'} <= indexes
+
+    A.db.session.query(A.Message).delete()
+    A.db.session.commit()
+    msg = A.Message(sender_id=2, receiver_id=1, content='po migraci', created_at=A.datetime.utcnow())
+    A.db.session.add(msg)
+    A.db.session.commit()
+    assert msg.id == 51
+    assert A.db.session.execute(A.text("SELECT rowid FROM message_search WHERE message_search MATCH 'migraci'")).scalar() == 51
@@ -0,0 +1,50 @@
+def send(client, to, text):
+    response = client.post(f'/messages/{to.username}', data={'message': text})
+    assert response.status_code == 302
+
+
+def unread(A, user):
+    A.db.session.expire_all()
+    counts = {c.peer_id: c.unread_count for c in A.Conversation.query.filter_by(user_id=user.id)}
+    return A.db.session.get(A.User, user.id).unread_total, counts
+
+
+def test_counters_grow_per_sender_and_reset_on_open(A, make_user, login):
+    a, b, c = make_user(), make_user(), make_user()
+    as_a, as_b, as_c = login(a), login(b), login(c)
+    for i in range(3):
+        send(as_b, a, f'from b {i}')
+    send(as_c, a, 'from c')
+
+    assert unread(A, a) == (4, {b.id: 3, c.id: 1})
+    assert unread(A, b)[0] == 0  # own messages never count
+    data = as_a.get('/messages/unread').get_json()
+    assert data == {'total': 4, 'contacts': {b.username: 3, c.username: 1}}
+
+    assert as_a.get(f'/messages/{b.username}').status_code == 200  # opening reads the thread
+    assert unread(A, a) == (1, {b.id: 0, c.id: 1})
+
+    assert as_a.post(f'/messages/{c.username}/read').status_code in (200, 204)
+    assert unread(A, a) == (0, {b.id: 0, c.id: 0})
+    assert as_a.post(f'/messages/{c.username}/read').status_code in (200, 204)
+    assert unread(A, a)[0] == 0  # marking twice does not go negative
+
+
+def test_reply_does_not_clear_peer_counter(A, make_user, login):
+    a, b = make_user(), make_user()
+    as_a, as_b = login(a), login(b)
+    send(as_b, a, 'ping')
+    send(as_a, b, 'pong')
+    assert unread(A, a) == (1, {b.id: 1})
+    assert unread(A, b) == (1, {a.id: 1})
+
+
+def test_read_marker_drives_receipts(A, make_user, login):
+    a, b = make_user(), make_user()
+    as_a, as_b = login(a), login(b)
+    send(as_a, b, 'hello')
+    last = A.Message.query.filter_by(sender_id=a.id).order_by(A.Message.id.desc()).first()
+    assert A.peer_read_marker(a, b) < last.id
+    as_b.get(f'/messages/{a.username}')
+    A.db.session.expire_all()
+    assert A.peer_read_marker(a, b) == last.id
@@ -0,0 +1,32 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+app.py does its setup (schema version check, engine profile) at import time;
+migrations are applied beforehand with `flask migrate`, and `create_app`
+refuses to serve a database whose schema is behind the code.
+With `preload_app` the master imports it once before forking, so workers only
+need to drop the connections inherited from the master (`reset_after_fork`).
+"""
+from app import app as application, db, SCHEMA_VERSION
+
+
+def create_app():
+    """Return the app built by app.py at import, after checking its schema version.
+
+    Not a real factory: configuration and extensions are module-level in app.py,
+    so every call returns the same instance.
+    """
+    version = application.config['SCHEMA_VERSION']
+    if version < SCHEMA_VERSION:
+        raise RuntimeError(f'Database schema is at version {version}, app requires {SCHEMA_VERSION}: run `flask migrate`')
+    return application
+
+
+def reset_after_fork():
+    """Discard pooled SQLite connections inherited from the preloading master."""
+    with application.app_context():
+        db.engine.dispose()
+
+
+app = create_app()